@@ -0,0 +1,68 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramWordSimilarity
+)
+from django.db.models import F, Q
+from rest_framework import filters
+
+from .models import SEARCH_CONFIG
+
+
+def build_product_search(search, path=''):
+    """
+    Retorna (condición, ranking) para buscar productos por texto.
+
+    Combina el tsvector indexado (prefijos de palabra, para nombres
+    escritos a medias) con similitud de trigramas sobre nombre y SKU
+    (tolerante a errores de tipeo) y prefijo exacto de SKU.
+    `path` es la ruta hasta el producto, p. ej. 'product__'.
+    """
+    condition = (
+        Q(**{f'{path}name__trigram_word_similar': search})
+        | Q(**{f'{path}sku__startswith': search.upper()})
+        | Q(**{f'{path}sku__trigram_similar': search.upper()})
+    )
+    rank = TrigramWordSimilarity(search, f'{path}name')
+
+    words = re.findall(r'\w+', search)
+    if words:
+        query = SearchQuery(
+            ' & '.join(f'{word}:*' for word in words),
+            search_type='raw',
+            config=SEARCH_CONFIG
+        )
+        condition |= Q(**{f'{path}search_vector': query})
+        rank = rank + SearchRank(F(f'{path}search_vector'), query)
+
+    return condition, rank
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter respaldado por índices GIN (tsvector y pg_trgm).
+
+    Las vistas indican la ruta al producto con `product_search_path`
+    ('' para Product, 'product__' para Stock/Movement). Los `search_fields`
+    de la vista se siguen buscando como en SearchFilter y se combinan con OR.
+    Sin `?ordering=`, los resultados se ordenan por relevancia, por lo que
+    este backend debe ir después de OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search = ' '.join(self.get_search_terms(request))
+        if not search:
+            return queryset
+
+        path = getattr(view, 'product_search_path', '')
+        condition, rank = build_product_search(search, path)
+        for field in self.get_search_fields(view, request) or []:
+            lookup = self.construct_search(str(field), queryset)
+            condition |= Q(**{lookup: search})
+
+        queryset = queryset.annotate(search_rank=rank).filter(condition)
+
+        ordering_param = getattr(view, 'ordering_param', None) or filters.OrderingFilter.ordering_param
+        if not request.query_params.get(ordering_param):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
@@ -0,0 +1,94 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de hilos compartido para generar derivadas fuera del request"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PRODUCT_IMAGE_WORKERS,
+                thread_name_prefix='product-images'
+            )
+    return _executor
+
+
+def schedule_derivatives(image_id):
+    """Encola la generación de derivadas cuando la transacción confirma"""
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_worker, image_id)
+    )
+
+
+def _run_in_worker(image_id):
+    try:
+        generate_derivatives(image_id)
+    except Exception:
+        logger.exception('No se pudieron generar derivadas de la imagen %s', image_id)
+    finally:
+        # Cada hilo abre su propia conexión; no dejarla colgada
+        connection.close()
+
+
+def generate_derivatives(image_id, force=False):
+    """
+    Genera las variantes WebP configuradas en PRODUCT_IMAGE_VARIANTS y las
+    registra en ProductImage.variants.
+
+    Si otra imagen comparte el mismo archivo (almacenamiento por contenido)
+    y ya tiene derivadas, se reutilizan sin abrir el original.
+    """
+    from .models import ProductImage
+
+    product_image = ProductImage.objects.filter(pk=image_id).only('id', 'image').first()
+    if not product_image or not product_image.image:
+        return {}
+
+    field = product_image.image
+    if not force:
+        shared = ProductImage.objects.filter(image=field.name).exclude(
+            pk=image_id
+        ).exclude(variants={}).values_list('variants', flat=True).first()
+        if shared:
+            ProductImage.objects.filter(pk=image_id, image=field.name).update(variants=shared)
+            return shared
+
+    storage = field.storage
+    with field.open('rb') as source:
+        original = Image.open(source)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    base, _ = os.path.splitext(field.name)
+    variants = {}
+    for variant, size in settings.PRODUCT_IMAGE_VARIANTS.items():
+        resized = original.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, 'WEBP', quality=settings.PRODUCT_IMAGE_QUALITY, method=4)
+
+        # Con almacenamiento por contenido el nombre final es el hash: una
+        # derivada idéntica ya guardada se reutiliza y nunca se sobrescribe
+        name = f'{base}_{variant}.webp'
+        variants[variant] = storage.save(name, ContentFile(buffer.getvalue()))
+
+    # Si la imagen se reemplazó mientras tanto, estas variantes ya no aplican
+    ProductImage.objects.filter(pk=image_id, image=field.name).update(variants=variants)
+    return variants
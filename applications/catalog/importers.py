@@ -0,0 +1,258 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .lookup import invalidate_all
+from .models import Category, Product, ProductPriceHistory
+
+
+class ImportFileError(Exception):
+    """Error que invalida el archivo completo (formato, cabeceras)"""
+
+
+class ProductImporter:
+    """
+    Importa productos desde CSV o XLSX leyendo fila por fila.
+
+    Las categorías se resuelven con una sola consulta, los productos se
+    insertan o actualizan por SKU en lotes (INSERT ... ON CONFLICT (sku))
+    sin pasar por Product.save()/full_clean(), y cada fila inválida se
+    reporta sin detener la importación.
+    """
+    BATCH_SIZE = 1000
+    REQUIRED_COLUMNS = ('sku', 'name', 'category', 'price')
+    OPTIONAL_COLUMNS = ('unit', 'min_stock', 'description', 'is_active')
+    MAX_ERRORS = 500
+
+    def __init__(self, file, dry_run=False, batch_size=None):
+        self.file = file
+        self.dry_run = dry_run
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.report = {
+            'dry_run': dry_run,
+            'total_rows': 0,
+            'created': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': [],
+        }
+
+    def run(self):
+        """Procesa el archivo y retorna el reporte por fila"""
+        rows = self._read_rows()
+        columns = self._read_header(rows)
+        self.update_fields = [
+            field for field in ('name', 'price', 'unit', 'min_stock',
+                                'description', 'is_active')
+            if field in columns
+        ] + ['category', 'updated_at']
+        self.categories = {
+            name.lower(): pk
+            for pk, name in Category.active.filter(
+                is_active=True
+            ).values_list('id', 'name')
+        }
+        self.seen_skus = set()
+        self.touched_categories = set()
+
+        if self.dry_run:
+            self._process(rows, columns)
+        else:
+            with transaction.atomic():
+                self._process(rows, columns)
+                # bulk_create no pasa por Product.save(): recalcular contadores
+                Category.refresh_products_count(self.touched_categories)
+                invalidate_all()
+        return self.report
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+    def _read_rows(self):
+        name = self.file.name.lower()
+        if name.endswith('.csv'):
+            return self._read_csv()
+        if name.endswith('.xlsx'):
+            return self._read_xlsx()
+        raise ImportFileError('Formato no soportado. Use CSV o XLSX')
+
+    def _read_csv(self):
+        self.file.seek(0)
+        stream = io.TextIOWrapper(self.file, encoding='utf-8-sig', newline='')
+        sample = stream.read(4096)
+        stream.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        return csv.reader(stream, dialect)
+
+    def _read_xlsx(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFileError('El soporte para XLSX requiere openpyxl')
+        self.file.seek(0)
+        workbook = load_workbook(self.file, read_only=True, data_only=True)
+        return workbook.active.iter_rows(values_only=True)
+
+    def _read_header(self, rows):
+        try:
+            header = next(rows)
+        except StopIteration:
+            raise ImportFileError('El archivo está vacío')
+
+        columns = [str(col).strip().lower() if col is not None else '' for col in header]
+        missing = [col for col in self.REQUIRED_COLUMNS if col not in columns]
+        if missing:
+            raise ImportFileError(
+                f"Faltan columnas requeridas: {', '.join(missing)}"
+            )
+        return columns
+
+    # ------------------------------------------------------------------
+    # Procesamiento
+    # ------------------------------------------------------------------
+    def _process(self, rows, columns):
+        batch = []
+        # La fila 1 es la cabecera
+        for row_number, values in enumerate(rows, start=2):
+            if not values or all(v in (None, '') for v in values):
+                continue
+            self.report['total_rows'] += 1
+            data = dict(zip(columns, values))
+            product, errors = self._build_product(data)
+            if errors:
+                self._add_error(row_number, data.get('sku'), errors)
+                continue
+            batch.append((row_number, product))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _build_product(self, data):
+        errors = {}
+
+        sku = self._text(data.get('sku')).upper()
+        if not sku:
+            errors['sku'] = 'El SKU no puede estar vacío'
+        elif len(sku) > 64:
+            errors['sku'] = 'El SKU no puede superar 64 caracteres'
+        elif sku in self.seen_skus:
+            errors['sku'] = 'SKU duplicado en el archivo'
+
+        name = self._text(data.get('name'))
+        if not name:
+            errors['name'] = 'El nombre no puede estar vacío'
+        elif len(name) > 255:
+            errors['name'] = 'El nombre no puede superar 255 caracteres'
+
+        category_id = self.categories.get(self._text(data.get('category')).lower())
+        if category_id is None:
+            errors['category'] = 'La categoría no existe o está inactiva'
+
+        try:
+            price = Decimal(self._text(data.get('price')).replace(',', '.'))
+            if not price.is_finite() or price <= 0:
+                errors['price'] = 'El precio debe ser mayor a cero'
+            elif price != price.quantize(Decimal('0.01')) or price >= Decimal('1e10'):
+                errors['price'] = 'El precio admite hasta 10 enteros y 2 decimales'
+        except InvalidOperation:
+            price = None
+            errors['price'] = 'Precio inválido'
+
+        min_stock = 0
+        if self._text(data.get('min_stock')):
+            try:
+                min_stock = int(Decimal(self._text(data.get('min_stock'))))
+                if min_stock < 0:
+                    errors['min_stock'] = 'El stock mínimo no puede ser negativo'
+            except (InvalidOperation, ValueError):
+                errors['min_stock'] = 'Stock mínimo inválido'
+
+        if errors:
+            return None, errors
+
+        self.seen_skus.add(sku)
+        is_active = self._text(data.get('is_active')).lower()
+        return Product(
+            sku=sku,
+            name=name,
+            category_id=category_id,
+            price=price,
+            unit=self._text(data.get('unit')) or 'unit',
+            min_stock=min_stock,
+            description=self._text(data.get('description')),
+            is_active=is_active not in ('0', 'false', 'no', 'n'),
+        ), None
+
+    def _flush(self, batch):
+        """Escribe un lote con un único INSERT ... ON CONFLICT (sku)"""
+        skus = [product.sku for _, product in batch]
+        existing = {
+            sku: (pk, is_deleted, category_id, price)
+            for pk, sku, is_deleted, category_id, price in Product.objects.filter(
+                sku__in=skus
+            ).values_list('id', 'sku', 'is_deleted', 'category_id', 'price')
+        }
+
+        products = []
+        price_changes = []
+        for row_number, product in batch:
+            pk, is_deleted, previous_category, previous_price = existing.get(
+                product.sku, (None, False, None, None)
+            )
+            if is_deleted:
+                self._add_error(row_number, product.sku, {
+                    'sku': 'El SKU pertenece a un producto eliminado'
+                })
+                continue
+            if pk is not None:
+                self.report['updated'] += 1
+                self.touched_categories.add(previous_category)
+                if 'price' in self.update_fields and previous_price != product.price:
+                    price_changes.append(ProductPriceHistory(
+                        product_id=pk, old_price=previous_price,
+                        new_price=product.price, reason='Importación masiva'
+                    ))
+            else:
+                self.report['created'] += 1
+            self.touched_categories.add(product.category_id)
+            products.append(product)
+
+        if self.dry_run or not products:
+            return
+
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=self.update_fields
+        )
+        ProductPriceHistory.objects.bulk_create(price_changes)
+        if 'min_stock' in self.update_fields:
+            from applications.warehouse.services import refresh_low_stock_flags
+            refresh_low_stock_flags(
+                Product.objects.filter(sku__in=[p.sku for p in products]).values('id')
+            )
+
+    def _add_error(self, row_number, sku, errors):
+        self.report['skipped'] += 1
+        if len(self.report['errors']) < self.MAX_ERRORS:
+            self.report['errors'].append({
+                'row': row_number,
+                'sku': self._text(sku) or None,
+                'errors': errors,
+            })
+
+    @staticmethod
+    def _text(value):
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+CARD_FIELDS = ('id', 'sku', 'name', 'price', 'unit', 'is_active')
+
+
+class LookupCache:
+    """
+    LRU en memoria del proceso con TTL: código -> ficha del producto.
+
+    Mantiene además el índice producto -> códigos para invalidar todas las
+    entradas de un producto (SKU y códigos de barras) de una vez. El TTL
+    acota cuánto puede quedar desactualizado un worker que no vio la
+    invalidación (otro proceso de gunicorn).
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._codes_by_product = {}
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            expires_at, card = entry
+            if expires_at < time.monotonic():
+                self._discard(code)
+                return None
+            self._entries.move_to_end(code)
+            return card
+
+    def set(self, code, card):
+        with self._lock:
+            self._discard(code)
+            self._entries[code] = (time.monotonic() + self.ttl, card)
+            self._codes_by_product.setdefault(card['id'], set()).add(code)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                for code in self._codes_by_product.pop(product_id, ()):
+                    self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._codes_by_product.clear()
+
+    def _discard(self, code):
+        entry = self._entries.pop(code, None)
+        if entry is None:
+            return
+        product_id = entry[1]['id']
+        codes = self._codes_by_product.get(product_id)
+        if codes is not None:
+            codes.discard(code)
+            if not codes:
+                del self._codes_by_product[product_id]
+
+
+lookup_cache = LookupCache(
+    maxsize=settings.PRODUCT_LOOKUP_CACHE_SIZE,
+    ttl=settings.PRODUCT_LOOKUP_CACHE_TTL
+)
+
+
+def normalize_code(code):
+    return code.strip().upper()
+
+
+def lookup_product(code):
+    """Ficha compacta (precio/stock) por SKU o código de barras exacto, o None"""
+    code = normalize_code(code)
+    card = lookup_cache.get(code)
+    if card is not None:
+        return card
+
+    from .models import Product
+    queryset = Product.objects.filter(is_deleted=False).annotate(
+        total_stock=Coalesce('stock_summary__total_quantity', Value(0)),
+        is_low=Coalesce('stock_summary__is_low', Value(True)),
+    ).values(*CARD_FIELDS, 'total_stock', 'is_low')
+
+    # Dos búsquedas por índice único en lugar de un OR sobre el JOIN
+    card = queryset.filter(sku=code).first() or queryset.filter(barcodes__code=code).first()
+    if card is not None:
+        lookup_cache.set(code, card)
+    return card
+
+
+def invalidate_products(product_ids):
+    """Descarta las fichas de los productos cuando la transacción confirma"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: lookup_cache.invalidate(product_ids))
+
+
+def invalidate_all():
+    """Para escrituras masivas que no pasan por Product.save()"""
+    transaction.on_commit(lookup_cache.clear)
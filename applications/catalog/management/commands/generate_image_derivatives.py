@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from applications.catalog.images import generate_derivatives
+from applications.catalog.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Genera las derivadas WebP de las imágenes de producto que no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenera también las imágenes que ya tienen derivadas'
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            images = images.filter(variants={})
+
+        generated = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                generate_derivatives(image_id, force=options['all'])
+                generated += 1
+            except Exception as exc:
+                self.stderr.write(f'Imagen {image_id}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(f'Derivadas generadas para {generated} imágenes'))
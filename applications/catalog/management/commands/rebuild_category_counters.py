@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from applications.catalog.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Category.products_count a partir de los productos no eliminados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category', type=int, action='append', dest='categories',
+            help='ID de categoría a recalcular (se puede repetir). Por defecto, todas'
+        )
+
+    def handle(self, *args, **options):
+        updated = Category.refresh_products_count(options['categories'])
+        self.stdout.write(self.style.SUCCESS(f'Contadores recalculados para {updated} categorías'))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_products_count(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    Product = apps.get_model('catalog', 'Product')
+    counts = Product.objects.filter(
+        category=OuterRef('pk'), is_deleted=False
+    ).order_by().values('category').annotate(total=Count('pk')).values('total')
+    Category.objects.update(products_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Productos no eliminados, mantenido por Product.save()'),
+        ),
+        migrations.RunPython(backfill_products_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:09
+
+import applications.core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_product_barcode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Guardada por hash de contenido; las repetidas se comparten', null=True, storage=applications.core.storage.ContentAddressedStorage(), upload_to='product_images/'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['image'], name='catalog_pro_image_9f96e5_idx'),
+        ),
+    ]
@@ -1,8 +1,19 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
+from applications.core.storage import ContentAddressedStorage
+from .lookup import invalidate_products, normalize_code
+
+
+# Configuración de texto usada por el tsvector de productos y sus búsquedas
+SEARCH_CONFIG = 'spanish'
+
 
 class ActiveManager(models.Manager):
     """Manager para obtener solo registros activos"""
@@ -16,6 +27,11 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    products_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Productos no eliminados, mantenido por Product.save()"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -29,6 +45,7 @@ class Category(models.Model):
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['is_deleted', 'is_active']),
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def __str__(self):
@@ -42,7 +59,22 @@ class Category(models.Model):
 
     def get_products_count(self):
         """Retorna cantidad de productos activos en esta categoría"""
-        return self.products.filter(is_deleted=False).count()
+        return self.products_count
+
+    @classmethod
+    def refresh_products_count(cls, category_ids=None):
+        """Recalcula los contadores con un solo UPDATE (todas o las indicadas)"""
+        queryset = cls.objects.all()
+        if category_ids is not None:
+            queryset = queryset.filter(pk__in=category_ids)
+        counts = Product.objects.filter(
+            category=models.OuterRef('pk'), is_deleted=False
+        ).order_by().values('category').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        return queryset.update(
+            products_count=Coalesce(models.Subquery(counts), 0)
+        )
 
 
 class Product(models.Model):
@@ -70,11 +102,29 @@ class Product(models.Model):
         help_text="Stock mínimo antes de alertar"
     )
     description = models.TextField(blank=True)
+    primary_image = models.ForeignKey(
+        'ProductImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        help_text="Imagen principal, mantenida por ProductImage.save()"
+    )
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('sku', weight='A', config='simple')
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True
+    )
 
     objects = models.Manager()
     active = ActiveManager()
@@ -89,6 +139,10 @@ class Product(models.Model):
             models.Index(fields=['category', 'is_deleted']),
             models.Index(fields=['is_deleted', 'is_active']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['updated_at', 'id']),
+            GinIndex(fields=['search_vector'], name='catalog_pro_search_gin'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='catalog_pro_name_trgm'),
+            GinIndex(fields=['sku'], opclasses=['gin_trgm_ops'], name='catalog_pro_sku_trgm'),
         ]
 
     def __str__(self):
@@ -106,9 +160,78 @@ class Product(models.Model):
         if not self.sku or not self.sku.strip():
             raise ValidationError({'sku': 'El SKU no puede estar vacío'})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_counter_state = instance._counter_state()
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def _counter_state(self):
+        """(categoría, eliminado) tal como cuenta para Category.products_count"""
+        if 'category_id' not in self.__dict__ or 'is_deleted' not in self.__dict__:
+            return None
+        return self.category_id, self.is_deleted
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_category_counters(adding)
+            self._record_price_change()
+
+        update_fields = kwargs.get('update_fields')
+        if not adding and (update_fields is None or 'min_stock' in update_fields):
+            self._refresh_low_stock_flag()
+        if not adding:
+            invalidate_products([self.pk])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            product_id = self.pk
+            result = super().delete(*args, **kwargs)
+            if not self.is_deleted:
+                self._bump_category_count(self.category_id, -1)
+            invalidate_products([product_id])
+        return result
+
+    def _update_category_counters(self, adding):
+        """Ajusta products_count en creación, cambio de categoría, borrado y restauración"""
+        old_state = (None, True) if adding else getattr(self, '_loaded_counter_state', None)
+        new_state = self._counter_state()
+        self._loaded_counter_state = new_state
+        if old_state is None or new_state is None or old_state == new_state:
+            return
+
+        old_category, old_deleted = old_state
+        new_category, new_deleted = new_state
+        if old_category and not old_deleted:
+            self._bump_category_count(old_category, -1)
+        if new_category and not new_deleted:
+            self._bump_category_count(new_category, 1)
+
+    def _record_price_change(self):
+        old_price = getattr(self, '_loaded_price', None)
+        self._loaded_price = self.price
+        if old_price is not None and old_price != self.price:
+            ProductPriceHistory.objects.create(
+                product=self,
+                old_price=old_price,
+                new_price=self.price,
+                changed_by=getattr(self, '_price_changed_by', None)
+            )
+
+    @staticmethod
+    def _bump_category_count(category_id, delta):
+        Category.objects.filter(pk=category_id).update(
+            products_count=Greatest(models.F('products_count') + delta, 0)
+        )
+
+    def _refresh_low_stock_flag(self):
+        """Recalcula is_low del stock y su resumen cuando cambia el mínimo"""
+        from applications.warehouse.services import refresh_low_stock_flags
+        refresh_low_stock_flags([self.pk])
 
     def soft_delete(self):
         """Marca como eliminado sin borrar de la BD"""
@@ -117,32 +240,110 @@ class Product(models.Model):
         self.is_active = False
         self.save()
 
+    def restore(self):
+        """Revierte un soft_delete()"""
+        self.is_deleted = False
+        self.deleted_at = None
+        self.is_active = True
+        self.save()
+
+    def get_stock_summary(self):
+        """Retorna el resumen de stock mantenido por el almacén (o None)"""
+        return getattr(self, 'stock_summary', None)
+
     def get_total_stock(self):
         """Retorna el stock total en todos los almacenes"""
-        from apps.warehouse.models import Stock
-        total = Stock.objects.filter(
-            product=self, 
-            warehouse__is_deleted=False
-        ).aggregate(
-            total=models.Sum('quantity')
-        )['total']
-        return total or 0
+        summary = self.get_stock_summary()
+        return summary.total_quantity if summary else 0
 
     def is_low_stock(self):
         """Verifica si el stock está por debajo del mínimo"""
-        return self.get_total_stock() <= self.min_stock
+        summary = self.get_stock_summary()
+        if summary:
+            return summary.is_low
+        # Sin resumen no hay stock registrado: 0 <= min_stock
+        return True
 
     def get_stock_by_warehouse(self):
         """Retorna stock agrupado por almacén"""
-        from apps.warehouse.models import Stock
+        from applications.warehouse.models import Stock
         return Stock.objects.filter(
-            product=self,
-            warehouse__is_deleted=False
+            product=self
         ).select_related('warehouse').values(
             'warehouse__name', 'quantity'
         )
 
 
+class ProductPriceHistory(models.Model):
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='price_history'
+    )
+    old_price = models.DecimalField(max_digits=12, decimal_places=2)
+    new_price = models.DecimalField(max_digits=12, decimal_places=2)
+    reason = models.CharField(max_length=255, blank=True)
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Product Price History'
+        verbose_name_plural = 'Product Price History'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.new_price}"
+
+
+class ProductBarcode(models.Model):
+    """Códigos de barras adicionales (EAN/UPC) de un producto"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='barcodes',
+        limit_choices_to={'is_deleted': False}
+    )
+    code = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Product Barcode'
+        verbose_name_plural = 'Product Barcodes'
+        ordering = ['code']
+
+    def __str__(self):
+        return f"{self.code} ({self.product_id})"
+
+    def clean(self):
+        self.code = normalize_code(self.code or '')
+        if not self.code:
+            raise ValidationError({'code': 'El código no puede estar vacío'})
+        if Product.objects.filter(sku=self.code).exclude(pk=self.product_id).exists():
+            raise ValidationError({'code': 'El código coincide con el SKU de otro producto'})
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        if self.pk:
+            # Si el código se movió de producto, invalidar también el anterior
+            previous = ProductBarcode.objects.filter(pk=self.pk).values_list('product_id', flat=True)
+            invalidate_products(previous)
+        super().save(*args, **kwargs)
+        invalidate_products([self.product_id])
+
+    def delete(self, *args, **kwargs):
+        invalidate_products([self.product_id])
+        return super().delete(*args, **kwargs)
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(
         Product, 
@@ -151,13 +352,20 @@ class ProductImage(models.Model):
         limit_choices_to={'is_deleted': False}
     )
     image = models.ImageField(
-        upload_to='product_images/%Y/%m/', 
+        upload_to='product_images/',
+        storage=ContentAddressedStorage(),
         null=True, 
-        blank=True
+        blank=True,
+        help_text="Guardada por hash de contenido; las repetidas se comparten"
     )
     caption = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Rutas de las derivadas WebP (thumb, medium, large)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -167,20 +375,53 @@ class ProductImage(models.Model):
         indexes = [
             models.Index(fields=['product', 'is_primary']),
             models.Index(fields=['order']),
+            models.Index(fields=['image']),
         ]
 
     def __str__(self):
         return f"Image for {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image_name = instance.__dict__.get('image')
+        return instance
+
     def save(self, *args, **kwargs):
         # Si esta imagen es primaria, desmarcar las demás
         if self.is_primary:
             ProductImage.objects.filter(
-                product=self.product, 
+                product_id=self.product_id, 
                 is_primary=True
             ).exclude(pk=self.pk).update(is_primary=False)
+
+        image_changed = self.image.name != getattr(self, '_loaded_image_name', None)
+        if image_changed:
+            self.variants = {}
         super().save(*args, **kwargs)
 
+        # Mantener el puntero Product.primary_image (al borrar, SET_NULL)
+        if self.is_primary:
+            Product.objects.filter(pk=self.product_id).update(primary_image=self)
+        else:
+            Product.objects.filter(
+                pk=self.product_id, primary_image=self
+            ).update(primary_image=None)
+
+        if image_changed and self.image:
+            from .images import schedule_derivatives
+            schedule_derivatives(self.pk)
+        self._loaded_image_name = self.image.name
+
+    def get_image_url(self, variant=None):
+        """URL de la derivada solicitada, o del original si aún no existe"""
+        if not self.image:
+            return None
+        name = self.variants.get(variant) if variant else None
+        if name:
+            return self.image.storage.url(name)
+        return self.image.url
+
     def clean(self):
         """Validar que la imagen no sea muy grande"""
         if self.image and hasattr(self.image, 'size'):
@@ -0,0 +1,94 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .lookup import invalidate_products
+from .models import Product, ProductPriceHistory
+
+CENT = Decimal('0.01')
+UPDATE_CHUNK_SIZE = 1000
+
+
+class PriceUpdateError(ValueError):
+    """La actualización dejaría precios inválidos; no se aplica nada"""
+
+    def __init__(self, skus):
+        self.skus = skus
+        super().__init__(f'Precios resultantes no válidos para: {", ".join(skus[:20])}')
+
+
+@transaction.atomic
+def bulk_update_prices(prices=None, skus=None, category=None, percentage=None,
+                       reason='', user=None):
+    """
+    Reprecia productos con UPDATEs por conjunto dentro de una transacción.
+
+    - `prices`: dict {sku: nuevo_precio}, aplicado con CASE por bloques.
+    - `skus` o `category` + `percentage`: un único UPDATE price = ROUND(price * f, 2).
+
+    Cada cambio se registra en ProductPriceHistory con un bulk insert.
+    """
+    queryset = Product.active.all()
+    if prices is not None:
+        queryset = queryset.filter(sku__in=prices.keys())
+    elif skus is not None:
+        queryset = queryset.filter(sku__in=skus)
+    else:
+        queryset = queryset.filter(category=category)
+
+    # Bloquear las filas y leer los precios actuales para el historial
+    current = list(queryset.select_for_update().values_list('id', 'sku', 'price'))
+
+    if prices is not None:
+        changes = [
+            (pk, sku, old, prices[sku]) for pk, sku, old in current
+            if old != prices[sku]
+        ]
+    else:
+        factor = (Decimal(1) + Decimal(percentage) / 100)
+        changes = [
+            (pk, sku, old, (old * factor).quantize(CENT, rounding=ROUND_HALF_UP))
+            for pk, sku, old in current
+        ]
+        changes = [change for change in changes if change[2] != change[3]]
+
+    invalid = [sku for _, sku, _, new in changes if new <= 0]
+    if invalid:
+        raise PriceUpdateError(invalid)
+
+    now = timezone.now()
+    if prices is not None:
+        for start in range(0, len(changes), UPDATE_CHUNK_SIZE):
+            chunk = changes[start:start + UPDATE_CHUNK_SIZE]
+            Product.objects.filter(pk__in=[pk for pk, *_ in chunk]).update(
+                price=Case(
+                    *[When(pk=pk, then=Value(new)) for pk, _, _, new in chunk],
+                    output_field=DecimalField(max_digits=12, decimal_places=2)
+                ),
+                updated_at=now
+            )
+    elif changes:
+        Product.objects.filter(pk__in=[pk for pk, *_ in changes]).update(
+            price=Round(F('price') * Value(factor), 2),
+            updated_at=now
+        )
+
+    ProductPriceHistory.objects.bulk_create([
+        ProductPriceHistory(
+            product_id=pk, old_price=old, new_price=new,
+            reason=reason, changed_by=user
+        )
+        for pk, _, old, new in changes
+    ], batch_size=UPDATE_CHUNK_SIZE)
+    invalidate_products(pk for pk, *_ in changes)
+
+    found = {sku for _, sku, _ in current}
+    requested = prices.keys() if prices is not None else (skus or [])
+    return {
+        'updated': len(changes),
+        'unchanged': len(current) - len(changes),
+        'not_found': sorted(set(requested) - found),
+    }
@@ -1,20 +1,17 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.db import transaction
-from .models import Category, Product, ProductImage
+from .models import Category, Product, ProductImage, ProductBarcode
+from applications.core.mixins import SparseFieldsMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
-    products_count = serializers.SerializerMethodField()
-
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'is_active', 
                   'created_at', 'updated_at', 'products_count']
-        read_only_fields = ['created_at', 'updated_at']
-
-    def get_products_count(self, obj):
-        """Retorna cantidad de productos activos"""
-        return obj.get_products_count()
+        # products_count es un contador mantenido por Product.save()
+        read_only_fields = ['created_at', 'updated_at', 'products_count']
 
     def validate_name(self, value):
         """Valida que el nombre no esté vacío y sea único"""
@@ -32,23 +29,38 @@ class CategorySerializer(serializers.ModelSerializer):
         return value.strip()
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
+def build_absolute_url(context, url):
+    """Convierte una URL relativa en absoluta si hay request en el contexto"""
+    if not url:
+        return None
+    request = context.get('request')
+    if request:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ProductImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'image_url', 'caption', 
+        fields = ['id', 'product', 'image', 'image_url', 'variants', 'caption', 
                   'is_primary', 'order', 'created_at']
         read_only_fields = ['created_at']
 
     def get_image_url(self, obj):
         """Retorna URL completa de la imagen"""
-        if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
-        return None
+        return build_absolute_url(self.context, obj.get_image_url())
+
+    def get_variants(self, obj):
+        """URLs de las derivadas WebP (usa el original mientras se generan)"""
+        if not obj.image:
+            return None
+        return {
+            variant: build_absolute_url(self.context, obj.get_image_url(variant))
+            for variant in settings.PRODUCT_IMAGE_VARIANTS
+        }
 
     def validate_image(self, value):
         """Valida el tamaño y tipo de imagen"""
@@ -69,7 +81,74 @@ class ProductImageSerializer(serializers.ModelSerializer):
         return value
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductImageReorderSerializer(serializers.Serializer):
+    """Nuevo orden de imágenes de un producto y, opcionalmente, la principal"""
+    images = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        help_text="IDs de imagen en el orden deseado"
+    )
+    primary = serializers.IntegerField(
+        required=False,
+        help_text="ID de la imagen principal"
+    )
+
+    def validate(self, data):
+        product = self.context['product']
+        image_ids = set(product.images.values_list('id', flat=True))
+
+        if len(set(data['images'])) != len(data['images']):
+            raise serializers.ValidationError({
+                'images': 'No puede repetir imágenes'
+            })
+        unknown = set(data['images']) - image_ids
+        if unknown:
+            raise serializers.ValidationError({
+                'images': f'Imágenes que no pertenecen al producto: {sorted(unknown)}'
+            })
+        if 'primary' in data and data['primary'] not in image_ids:
+            raise serializers.ValidationError({
+                'primary': 'La imagen no pertenece al producto'
+            })
+        return data
+
+
+class ProductBarcodeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductBarcode
+        fields = ['id', 'product', 'code', 'created_at']
+        read_only_fields = ['created_at']
+
+    def validate_code(self, value):
+        """Normaliza el código y valida que no choque con un SKU ajeno"""
+        value = value.strip().upper()
+        if not value:
+            raise serializers.ValidationError("El código no puede estar vacío")
+        return value
+
+    def validate(self, data):
+        product = data.get('product') or self.instance.product
+        code = data.get('code') or self.instance.code
+        if Product.objects.filter(sku=code).exclude(pk=product.pk).exists():
+            raise serializers.ValidationError({
+                'code': 'El código coincide con el SKU de otro producto'
+            })
+        return data
+
+
+class ProductLookupSerializer(serializers.Serializer):
+    """Ficha compacta para lectores de códigos de barras"""
+    id = serializers.IntegerField()
+    sku = serializers.CharField()
+    name = serializers.CharField()
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    unit = serializers.CharField()
+    is_active = serializers.BooleanField()
+    total_stock = serializers.IntegerField()
+    is_low = serializers.BooleanField()
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer ligero para listados"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     primary_image = serializers.SerializerMethodField()
@@ -81,26 +160,25 @@ class ProductListSerializer(serializers.ModelSerializer):
                   'unit', 'primary_image', 'stock_status', 'is_active']
 
     def get_primary_image(self, obj):
-        """Retorna la imagen principal del producto"""
-        image = obj.images.filter(is_primary=True).first()
-        if image and image.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(image.image.url)
-            return image.image.url
+        """Retorna la miniatura de la imagen principal del producto"""
+        image = obj.primary_image
+        if image:
+            return build_absolute_url(self.context, image.get_image_url('thumb'))
         return None
 
     def get_stock_status(self, obj):
-        """Retorna estado del stock"""
-        total_stock = obj.get_total_stock()
+        """Retorna estado del stock desde el resumen desnormalizado"""
+        summary = obj.get_stock_summary()
         return {
-            'quantity': total_stock,
-            'is_low': obj.is_low_stock(),
-            'min_stock': obj.min_stock
+            'quantity': summary.total_quantity if summary else 0,
+            'is_low': summary.is_low if summary else True,
+            'min_stock': obj.min_stock,
+            'warehouses_count': summary.warehouses_count if summary else 0,
+            'last_movement_at': summary.last_movement_at if summary else None
         }
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.active.all(),
@@ -111,6 +189,7 @@ class ProductSerializer(serializers.ModelSerializer):
         }
     )
     images = ProductImageSerializer(many=True, read_only=True)
+    barcodes = serializers.SlugRelatedField(many=True, read_only=True, slug_field='code')
     total_stock = serializers.SerializerMethodField()
     is_low_stock = serializers.SerializerMethodField()
     stock_by_warehouse = serializers.SerializerMethodField()
@@ -119,7 +198,7 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'name', 'sku', 'category', 'category_id', 'unit', 
                   'price', 'min_stock', 'description', 'is_active',
-                  'created_at', 'updated_at', 'images', 'total_stock', 
+                  'created_at', 'updated_at', 'images', 'barcodes', 'total_stock', 
                   'is_low_stock', 'stock_by_warehouse']
         read_only_fields = ['created_at', 'updated_at']
 
@@ -133,8 +212,9 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_stock_by_warehouse(self, obj):
         """Retorna stock por almacén"""
-        # Solo incluir si se solicita explícitamente
-        if self.context.get('include_warehouse_stock'):
+        # Solo incluir si se solicita explícitamente (contexto o ?fields=)
+        if (self.context.get('include_warehouse_stock')
+                or self.is_field_requested('stock_by_warehouse')):
             return list(obj.get_stock_by_warehouse())
         return None
 
@@ -190,23 +270,115 @@ class ProductSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def update(self, instance, validated_data):
         """Actualizar producto con transacción"""
+        request = self.context.get('request')
+        if request:
+            # Queda registrado en ProductPriceHistory si cambia el precio
+            instance._price_changed_by = request.user
         return super().update(instance, validated_data)
 
 
+class CategorySyncSerializer(serializers.ModelSerializer):
+    """Representación compacta para el feed de cambios (incluye eliminados)"""
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'is_active', 'is_deleted', 'deleted_at', 'updated_at']
+
+
+class ProductSyncSerializer(serializers.ModelSerializer):
+    """Representación compacta para el feed de cambios (incluye eliminados)"""
+    class Meta:
+        model = Product
+        fields = ['id', 'sku', 'name', 'category', 'price', 'unit', 'min_stock',
+                  'is_active', 'is_deleted', 'deleted_at', 'updated_at']
+
+
+class PriceItemSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def validate_sku(self, value):
+        return value.strip().upper()
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("El precio debe ser mayor a cero")
+        return value
+
+
+class ProductBulkPriceSerializer(serializers.Serializer):
+    """
+    Repreciado masivo. Use una de estas formas:
+    - prices: [{sku, price}, ...]
+    - skus: [...] + percentage
+    - category_id + percentage
+    """
+    prices = PriceItemSerializer(many=True, required=False, allow_empty=False)
+    skus = serializers.ListField(
+        child=serializers.CharField(max_length=64),
+        required=False,
+        allow_empty=False
+    )
+    category_id = serializers.PrimaryKeyRelatedField(
+        queryset=Category.active.all(),
+        source='category',
+        required=False
+    )
+    percentage = serializers.DecimalField(
+        max_digits=7, decimal_places=2, required=False,
+        help_text="Ajuste porcentual, p. ej. 5 o -10"
+    )
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def validate_skus(self, value):
+        return [sku.strip().upper() for sku in value]
+
+    def validate_percentage(self, value):
+        if value <= -100:
+            raise serializers.ValidationError("El ajuste debe ser mayor a -100%")
+        return value
+
+    def validate(self, data):
+        targets = [key for key in ('prices', 'skus', 'category') if key in data]
+        if len(targets) != 1:
+            raise serializers.ValidationError(
+                "Indique solo uno de: prices, skus o category_id"
+            )
+        if 'prices' in data:
+            if 'percentage' in data:
+                raise serializers.ValidationError({
+                    'percentage': 'No se usa junto con prices'
+                })
+            prices = {item['sku']: item['price'] for item in data['prices']}
+            if len(prices) != len(data['prices']):
+                raise serializers.ValidationError({
+                    'prices': 'No puede repetir SKUs'
+                })
+            data['prices'] = prices
+        elif 'percentage' not in data:
+            raise serializers.ValidationError({
+                'percentage': 'Se requiere percentage para skus o category_id'
+            })
+        return data
+
+
 class ProductBulkUploadSerializer(serializers.Serializer):
     """Serializer para carga masiva de productos"""
     file = serializers.FileField(
-        help_text="Archivo CSV o Excel con productos"
+        help_text="Archivo CSV o Excel (.xlsx) con productos"
+    )
+    dry_run = serializers.BooleanField(
+        default=False,
+        help_text="Solo valida el archivo, sin guardar cambios"
     )
 
     def validate_file(self, value):
         """Valida el archivo"""
-        allowed_extensions = ['.csv', '.xlsx', '.xls']
+        allowed_extensions = ['.csv', '.xlsx']
         file_name = value.name.lower()
         
         if not any(file_name.endswith(ext) for ext in allowed_extensions):
             raise serializers.ValidationError(
-                "Solo se permiten archivos CSV o Excel"
+                "Solo se permiten archivos CSV o Excel (.xlsx)"
             )
         
         # Validar tamaño (10MB máximo)
@@ -0,0 +1,61 @@
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(updated_at, pk):
+    raw = f'{updated_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """
+    Acepta el cursor opaco devuelto por el feed o, para la primera
+    sincronización, una fecha ISO 8601. Retorna (updated_at, pk).
+    """
+    updated_at = parse_datetime(value)
+    if updated_at is not None:
+        if timezone.is_naive(updated_at):
+            updated_at = timezone.make_aware(updated_at)
+        return updated_at, 0
+
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        updated_at = parse_datetime(timestamp)
+        if updated_at is None:
+            raise ValueError(timestamp)
+        return updated_at, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(value)
+
+
+def changes_since(queryset, cursor=None, limit=500):
+    """
+    Filas tocadas después del cursor, en orden (updated_at, id).
+
+    Solo se entregan filas más antiguas que CATALOG_SYNC_LAG_SECONDS para
+    que una transacción lenta no confirme por detrás de un cursor ya
+    entregado. Retorna (filas, siguiente_cursor, hay_más).
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.CATALOG_SYNC_LAG_SECONDS)
+    queryset = queryset.filter(updated_at__lte=horizon)
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+        )
+
+    rows = list(queryset.order_by('updated_at', 'pk')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].pk) if rows else cursor
+    return rows, next_cursor, has_more
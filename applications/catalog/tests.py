@@ -1,3 +1,88 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from applications.users.models import User
+from .models import Category, Product, ProductImage
+from .views import ProductViewSet
+
+
+class ProductListTests(APITestCase):
+    url = '/api/catalog/products/'
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create: sin la señal post_save que crea el Profile
+        cls.user, = User.objects.bulk_create([User(username='admin', role=User.ADMIN)])
+        cls.category = Category.objects.create(name='Lácteos')
+        cls.products = []
+        for index in range(3):
+            product = Product.objects.create(
+                sku=f'SKU-{index}', name=f'Producto {index}',
+                category=cls.category, price=Decimal('10.00')
+            )
+            image = ProductImage.objects.create(
+                product=product, is_primary=True,
+                image=f'product_images/aa/bb/{index}.jpg'
+            )
+            ProductImage.objects.filter(pk=image.pk).update(variants={
+                'thumb': f'product_images/derivatives/{index}_thumb.webp',
+                'medium': f'product_images/derivatives/{index}_medium.webp',
+            })
+            cls.products.append(product)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_list_resolves_primary_image_with_a_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        # COUNT de la paginación + un SELECT con los JOIN; sin prefetch de images
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('catalog_productimage"."product_id" IN', queries[-1]['sql'])
+
+    def test_list_returns_only_the_thumb(self):
+        response = self.client.get(self.url)
+        row = response.data['results'][0]
+        self.assertNotIn('images', row)
+        self.assertTrue(row['primary_image'].endswith('_thumb.webp'))
+
+    def test_detail_keeps_full_images(self):
+        response = self.client.get(f'{self.url}{self.products[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['images']), 1)
+
+    def test_export_uses_the_list_queryset_and_filters(self):
+        other = Category.objects.create(name='Bebidas')
+        Product.objects.create(sku='SKU-X', name='Otro', category=other, price=Decimal('5.00'))
+        response = self.client.get(
+            f'{self.url}export/', {'file_format': 'csv', 'category': other.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('SKU-X', lines[1])
+
+    def test_sparse_list_joins_only_the_requested_relations(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,sku'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'sku'})
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'omit': 'primary_image'})
+        self.assertIn('"catalog_category"', queries[-1]['sql'])
+        self.assertNotIn('"catalog_productimage"', queries[-1]['sql'])
+
+    def test_queryset_does_not_build_a_serializer(self):
+        with mock.patch.object(
+            ProductViewSet, 'get_serializer', side_effect=AssertionError('serializer')
+        ):
+            response = self.client.get(f'{self.url}export/', {'file_format': 'csv'})
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
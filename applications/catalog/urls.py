@@ -1,9 +1,10 @@
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, ProductImageViewSet
+from .views import CategoryViewSet, ProductViewSet, ProductImageViewSet, ProductBarcodeViewSet
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'product-images', ProductImageViewSet)
+router.register(r'product-barcodes', ProductBarcodeViewSet)
 
 urlpatterns = router.urls
@@ -1,14 +1,64 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, Value, F
 
-from .models import Category, Product, ProductImage
-from .serializers import CategorySerializer, ProductSerializer, ProductImageSerializer
+from .models import Category, Product, ProductImage, ProductBarcode
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductListSerializer, ProductImageSerializer,
+    ProductBulkUploadSerializer, ProductImageReorderSerializer,
+    CategorySyncSerializer, ProductSyncSerializer, ProductBulkPriceSerializer,
+    ProductBarcodeSerializer, ProductLookupSerializer
+)
+from .importers import ProductImporter, ImportFileError
+from .filters import ProductSearchFilter
+from .sync import changes_since, InvalidCursor
+from .pricing import bulk_update_prices, PriceUpdateError
+from .lookup import lookup_product
 from applications.users.permissions import IsAdminOrVendedor
+from applications.core.pagination import SelectablePagination
+from applications.core.mixins import SparseFieldsViewMixin
+from applications.core.exports import ExportMixin
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class ChangesFeedMixin:
+    """
+    Acción `changes`: feed incremental para clientes POS.
+    GET .../changes/?updated_since=<cursor o fecha ISO> devuelve solo las
+    filas tocadas desde el cursor, incluidas las eliminadas (is_deleted).
+    """
+    sync_serializer_class = None
+
+    def get_sync_queryset(self):
+        return self.queryset.model.objects.all()
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Cambios desde updated_since (con lápidas de eliminados)"""
+        try:
+            rows, next_cursor, has_more = changes_since(
+                self.get_sync_queryset(),
+                request.query_params.get('updated_since'),
+                settings.CATALOG_SYNC_PAGE_SIZE
+            )
+        except InvalidCursor:
+            return Response(
+                {'error': 'updated_since inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'results': self.sync_serializer_class(rows, many=True).data,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        })
+
+
+class CategoryViewSet(ChangesFeedMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrVendedor]
@@ -16,24 +66,156 @@ class CategoryViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    sync_serializer_class = CategorySyncSerializer
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related('category').prefetch_related('images')
+class ProductViewSet(ChangesFeedMixin, ExportMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.defer('search_vector')
     serializer_class = ProductSerializer
+    select_related_fields = {
+        'category': 'category',
+        'category_name': 'category',
+        'total_stock': 'stock_summary',
+        'is_low_stock': 'stock_summary',
+        'stock_status': 'stock_summary',
+        'primary_image': 'primary_image',
+    }
+    prefetch_related_fields = {'images': 'images', 'barcodes': 'barcodes'}
+    export_name = 'productos'
+    export_fields = {
+        'id': 'id',
+        'sku': 'sku',
+        'name': 'name',
+        'category': 'category__name',
+        'price': 'price',
+        'unit': 'unit',
+        'min_stock': 'min_stock',
+        'total_stock': 'stock_summary__total_quantity',
+        'is_active': 'is_active',
+        'is_deleted': 'is_deleted',
+        'updated_at': 'updated_at',
+    }
     permission_classes = [permissions.IsAuthenticated, IsAdminOrVendedor]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_fields = ['category']
-    search_fields = ['name', 'sku', 'description']
+    # name, sku y description se buscan vía search_vector (ver ProductSearchFilter)
+    search_fields = []
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['-created_at']
+    pagination_class = SelectablePagination
+    cursor_ordering = ('-created_at', '-id')
+    sync_serializer_class = ProductSyncSerializer
+
+    def get_sync_queryset(self):
+        return Product.objects.only(*ProductSyncSerializer.Meta.fields)
+
+    def get_serializer_class(self):
+        """El listado usa la ficha ligera: imagen principal por JOIN, sin prefetch de images"""
+        if self.action == 'list':
+            return ProductListSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser],
+            serializer_class=ProductBulkUploadSerializer)
+    def bulk_upload(self, request):
+        """Carga masiva de productos (CSV/XLSX) con upsert por SKU"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        importer = ProductImporter(
+            serializer.validated_data['file'],
+            dry_run=serializer.validated_data['dry_run']
+        )
+        try:
+            report = importer.run()
+        except ImportFileError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report)
+
+    @action(detail=False, methods=['post'], serializer_class=ProductBulkPriceSerializer)
+    def bulk_price_update(self, request):
+        """Repreciado masivo por SKU, categoría o porcentaje"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            result = bulk_update_prices(
+                prices=data.get('prices'),
+                skus=data.get('skus'),
+                category=data.get('category'),
+                percentage=data.get('percentage'),
+                reason=data.get('reason', ''),
+                user=request.user
+            )
+        except PriceUpdateError as exc:
+            return Response(
+                {'error': str(exc), 'skus': exc.skus},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result)
+
+    @action(detail=False, methods=['get'], url_path=r'lookup/(?P<code>[^/]+)',
+            serializer_class=ProductLookupSerializer, filter_backends=[], pagination_class=None)
+    def lookup(self, request, code=None):
+        """Búsqueda exacta por SKU o código de barras (caché en memoria)"""
+        card = lookup_product(code)
+        if card is None:
+            return Response(
+                {'error': 'Producto no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(ProductLookupSerializer(card).data)
+
+    @action(detail=True, methods=['post'], serializer_class=ProductImageReorderSerializer)
+    def reorder_images(self, request, pk=None):
+        """Reordena las imágenes y fija la principal en una sola sentencia"""
+        product = self.get_object()
+        serializer = self.get_serializer(data=request.data, context={
+            **self.get_serializer_context(), 'product': product
+        })
+        serializer.is_valid(raise_exception=True)
+        image_ids = serializer.validated_data['images']
+        primary_id = serializer.validated_data.get('primary')
+
+        changes = {
+            'order': Case(
+                *[When(pk=image_id, then=Value(position))
+                  for position, image_id in enumerate(image_ids)],
+                default=F('order')
+            )
+        }
+        if primary_id is not None:
+            changes['is_primary'] = Case(
+                When(pk=primary_id, then=Value(True)),
+                default=Value(False)
+            )
+
+        with transaction.atomic():
+            ProductImage.objects.filter(product=product).update(**changes)
+            if primary_id is not None:
+                Product.objects.filter(pk=product.pk).update(primary_image_id=primary_id)
+
+        images = ProductImage.objects.filter(product=product)
+        return Response(
+            ProductImageSerializer(images, many=True, context=self.get_serializer_context()).data
+        )
 
 
 class ProductImageViewSet(viewsets.ModelViewSet):
-    queryset = ProductImage.objects.select_related('product')
+    queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrVendedor]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['product']
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+class ProductBarcodeViewSet(viewsets.ModelViewSet):
+    queryset = ProductBarcode.objects.all()
+    serializer_class = ProductBarcodeSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrVendedor]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = ['product']
+    search_fields = ['code']
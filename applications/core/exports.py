@@ -0,0 +1,72 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Pseudo-buffer: csv.writer escribe y el generador emite la línea"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream_export(columns, rows, file_format, filename):
+    """StreamingHttpResponse en CSV o NDJSON con memoria constante"""
+    generator = iter_csv(columns, rows) if file_format == 'csv' else iter_ndjson(columns, rows)
+    response = StreamingHttpResponse(generator, content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+class ExportMixin:
+    """
+    Acción `export` para ViewSets: GET .../export/?file_format=csv|ndjson.
+
+    Respeta los filtros, búsqueda y ordering de la vista, pero recorre el
+    queryset con un cursor del servidor (iterator) sobre una proyección
+    values_list, sin serializers ni paginación.
+    `export_fields` mapea columna -> lookup del ORM.
+    """
+    export_fields = {}
+    export_name = 'export'
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Exportación completa en streaming (CSV o NDJSON)"""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'Formato inválido. Use csv o ndjson'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Mismo alcance que el listado (get_queryset), proyectado con values_list
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values_list(*self.export_fields.values()).iterator(
+            chunk_size=self.export_chunk_size
+        )
+        filename = f"{self.export_name}-{timezone.localdate():%Y%m%d}"
+        return stream_export(list(self.export_fields), rows, file_format, filename)
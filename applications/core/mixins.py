@@ -0,0 +1,100 @@
+from rest_framework import permissions
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Mixin de serializer para ?fields=a,b y ?omit=c,d en lecturas.
+
+    Los campos no solicitados se quitan antes de serializar, así que sus
+    SerializerMethodField ni siquiera se ejecutan. Solo aplica al
+    serializer raíz; los anidados se mantienen completos.
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, omitted = self.get_sparse_params()
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        for name in omitted:
+            fields.pop(name, None)
+        return fields
+
+    def get_sparse_params(self):
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return set(), set()
+        parent = self.parent
+        if parent is not None and not (parent.parent is None and getattr(parent, 'many', False)):
+            return set(), set()
+        return (
+            parse_field_list(request.query_params.get(self.fields_param)),
+            parse_field_list(request.query_params.get(self.omit_param)),
+        )
+
+    def is_field_requested(self, name):
+        """True si el campo se pidió explícitamente en ?fields="""
+        requested, _ = self.get_sparse_params()
+        return name in requested
+
+
+class SparseFieldsViewMixin:
+    """
+    Mixin de ViewSet que aplica select_related/prefetch_related solo para los
+    campos que el serializer va a representar.
+
+    `select_related_fields` y `prefetch_related_fields` mapean el nombre del
+    campo del serializer a la ruta de la relación que necesita. Las acciones
+    de `sparse_fields_skip_actions` no responden con el serializer de la
+    vista (exportación con values_list, lotes, reservas) y usan el queryset
+    sin relaciones.
+    """
+    select_related_fields = {}
+    prefetch_related_fields = {}
+    sparse_fields_skip_actions = ('export', 'batch', 'reserve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.sparse_fields_skip_actions:
+            return queryset
+        names = self.get_serializer_field_names()
+
+        select = {path for field, path in self.select_related_fields.items() if field in names}
+        prefetch = {path for field, path in self.prefetch_related_fields.items() if field in names}
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
+
+    def get_serializer_field_names(self):
+        """
+        Campos del serializer de la acción según su clase y ?fields=/?omit=,
+        sin instanciarlo (get_queryset también corre en get_object).
+        """
+        if getattr(self, 'swagger_fake_view', False) or self.request is None:
+            return set()
+        serializer_class = self.get_serializer_class()
+        meta = getattr(serializer_class, 'Meta', None)
+        fields = getattr(meta, 'fields', None)
+        if isinstance(fields, (list, tuple)):
+            names = set(fields)
+        elif meta is None:
+            names = set(serializer_class._declared_fields)
+        else:
+            # '__all__' o exclude: solo el serializer sabe qué campos quedan
+            return set(self.get_serializer().fields.keys())
+
+        if (issubclass(serializer_class, SparseFieldsMixin)
+                and self.request.method in permissions.SAFE_METHODS):
+            params = self.request.query_params
+            requested = parse_field_list(params.get(serializer_class.fields_param))
+            if requested:
+                names &= requested
+            names -= parse_field_list(params.get(serializer_class.omit_param))
+        return names
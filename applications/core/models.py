@@ -5,9 +5,20 @@ from django.utils import timezone
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.CharField(max_length=500)
+    # Clave de deduplicación (p. ej. low_stock:<producto>:<día>); vacía = sin deduplicar
+    key = models.CharField(max_length=120, blank=True, default='')
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                condition=~models.Q(key=''),
+                name='core_notification_user_key_uniq'
+            ),
+        ]
+
 class Report(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -0,0 +1,77 @@
+from rest_framework.pagination import (
+    BasePagination, CursorPagination, PageNumberPagination
+)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) usando `view.cursor_ordering`.
+
+    DRF ubica el cursor solo con el primer campo del ordering: las filas que
+    comparten ese valor se recorren con un offset dentro del empate. Por eso
+    debe ser una columna indexada y casi única (p. ej. -created_at), no una
+    fecha sin hora. Se ignora ?ordering= para que cada página siga siendo un
+    rango sobre el índice.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(view.cursor_ordering)
+
+
+class SelectablePagination(BasePagination):
+    """
+    Paginación por página (por defecto) o por cursor, elegida en cada request
+    con ?pagination=cursor (o implícitamente al enviar ?cursor=).
+    """
+    pagination_param = 'pagination'
+    page_number_class = PageNumberPagination
+    cursor_class = KeysetCursorPagination
+
+    def __init__(self):
+        self.page_number = self.page_number_class()
+        self.cursor = self.cursor_class()
+        self.active = self.page_number
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.pagination_param) == 'cursor'
+            or self.cursor.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.cursor if self.use_cursor(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return self.active.display_page_controls
+
+    def to_html(self):
+        return self.active.to_html()
+
+    def get_results(self, data):
+        return self.active.get_results(data)
+
+    def get_schema_fields(self, view):
+        return self.page_number.get_schema_fields(view) + self.cursor.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.pagination_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Use "cursor" para paginación por cursor',
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+            *self.page_number.get_schema_operation_parameters(view),
+            *self.cursor.get_schema_operation_parameters(view),
+        ]
@@ -0,0 +1,73 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(content, algorithm='sha256'):
+    """Hash del contenido leyendo por chunks (sin cargarlo entero en memoria)"""
+    hasher = hashlib.new(algorithm)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Escribe cada subida directo a un archivo temporal y calcula su SHA-256
+    mientras llegan los chunks. El hash queda en `file.content_hash`.
+    """
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+@deconstructible(path='applications.core.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Guarda cada archivo por el SHA-256 de su contenido:
+    <carpeta raíz>/ab/cd/abcd....ext
+
+    Un mismo contenido subido varias veces ocupa un solo archivo y un nombre
+    nunca cambia de contenido, así que sus URLs se pueden cachear como
+    inmutables. Como un archivo puede estar referenciado por varias filas,
+    borrar una fila nunca debe borrar el archivo.
+
+    Si dos subidas iguales llegan a la vez, ambas escriben el mismo nombre:
+    la segunda sobrescribe bytes idénticos en lugar de recibir un sufijo.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        """El nombre es el hash: nunca se agrega sufijo"""
+        return name
+
+    def get_content_name(self, name, content):
+        digest = getattr(content, 'content_hash', None) or file_digest(content)
+        root = name.replace('\\', '/').split('/')[0] if '/' in name else ''
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(root, digest[:2], digest[2:4], digest + extension)
@@ -1,3 +1,29 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from .storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.TemporaryDirectory()
+        self.addCleanup(self.location.cleanup)
+        self.storage = ContentAddressedStorage(location=self.location.name)
+
+    def test_same_content_same_name(self):
+        first = self.storage.save('product_images/a.jpg', ContentFile(b'abc'))
+        second = self.storage.save('product_images/b.JPG', ContentFile(b'abc'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('product_images/ba/78/ba7816bf'))
+
+    def test_concurrent_upload_overwrites_instead_of_renaming(self):
+        first = self.storage.save('product_images/a.jpg', ContentFile(b'abc'))
+        # La otra subida no vio el archivo en exists() y llega a escribirlo
+        with mock.patch.object(ContentAddressedStorage, 'exists', return_value=False):
+            second = self.storage.save('product_images/a.jpg', ContentFile(b'abc'))
+        self.assertEqual(first, second)
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'abc')
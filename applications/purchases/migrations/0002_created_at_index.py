@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0001_initial'),
+        ('warehouse', '0008_stock_avg_cost'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['-created_at'], name='purchases_p_created_5bc4ec_idx'),
+        ),
+    ]
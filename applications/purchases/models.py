@@ -53,6 +53,7 @@ class Purchase(models.Model):
             models.Index(fields=['invoice_number']),
             models.Index(fields=['supplier', '-purchase_date']),
             models.Index(fields=['warehouse', '-purchase_date']),
+            models.Index(fields=['-created_at']),
         ]
 
     def __str__(self):
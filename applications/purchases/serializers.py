@@ -3,7 +3,8 @@ from django.db import transaction
 from django.utils import timezone
 from .models import Supplier, Purchase, PurchaseDetail
 from applications.catalog.models import Product
-from applications.warehouse.models import Warehouse, Stock
+from applications.warehouse.models import Warehouse
+from applications.warehouse.services import post_inventory
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -138,30 +139,37 @@ class PurchaseSerializer(serializers.ModelSerializer):
         # Crear la compra
         purchase = Purchase.objects.create(**validated_data)
 
-        # Crear detalles y actualizar stock
-        for detail_data in details_data:
-            product = detail_data['product']
-            quantity = detail_data['quantity']
-            cost_price = detail_data['cost_price']
-            subtotal = quantity * cost_price
-
-            # Crear detalle
-            PurchaseDetail.objects.create(
+        # Crear detalles en un solo INSERT
+        PurchaseDetail.objects.bulk_create([
+            PurchaseDetail(
                 purchase=purchase,
-                product=product,
-                quantity=quantity,
-                cost_price=cost_price,
-                subtotal=subtotal
+                product=detail_data['product'],
+                quantity=detail_data['quantity'],
+                cost_price=detail_data['cost_price'],
+                subtotal=detail_data['quantity'] * detail_data['cost_price']
             )
+            for detail_data in details_data
+        ])
 
-            # Actualizar o crear stock en el almacén especificado
-            stock, created = Stock.objects.get_or_create(
-                product=product,
-                warehouse=purchase.warehouse,
-                defaults={'quantity': 0}
+        # Un único asiento de inventario para toda la compra; el costo de
+        # cada producto (ponderado si se repite) actualiza su promedio en Stock
+        quantities = {}
+        amounts = {}
+        for detail_data in details_data:
+            product_id = detail_data['product'].pk
+            quantities[product_id] = quantities.get(product_id, 0) + detail_data['quantity']
+            amounts[product_id] = amounts.get(product_id, 0) + (
+                detail_data['quantity'] * detail_data['cost_price']
             )
-            stock.quantity += quantity
-            stock.save()
+        post_inventory(
+            [(detail_data['product'].pk, purchase.warehouse_id, detail_data['quantity'])
+             for detail_data in details_data],
+            reference=f"PUR-{purchase.pk}", user=purchase.created_by,
+            costs={
+                (product_id, purchase.warehouse_id): amounts[product_id] / quantity
+                for product_id, quantity in quantities.items()
+            }
+        )
 
         return purchase
 
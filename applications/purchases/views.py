@@ -9,6 +9,7 @@ from django.utils import timezone
 from .models import Supplier, Purchase, PurchaseDetail
 from .serializers import SupplierSerializer, PurchaseSerializer, PurchaseDetailSerializer
 from applications.users.permissions import IsAdminOrAlmacenero
+from applications.core.pagination import SelectablePagination
 
 
 class SupplierViewSet(viewsets.ModelViewSet):
@@ -32,6 +33,8 @@ class PurchaseViewSet(viewsets.ModelViewSet):
     search_fields = ['invoice_number', 'supplier__name']
     ordering_fields = ['purchase_date', 'total_amount', 'created_at']
     ordering = ['-purchase_date', '-created_at']
+    pagination_class = SelectablePagination
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         """Queryset optimizado con relaciones para mejorar rendimiento"""
@@ -50,6 +50,7 @@ class Sale(models.Model):
             models.Index(fields=['-sale_date']),
             models.Index(fields=['invoice_number']),
             models.Index(fields=['customer', '-sale_date']),
+            models.Index(fields=['-created_at']),
         ]
 
     def __str__(self):
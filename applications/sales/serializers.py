@@ -3,11 +3,17 @@ from rest_framework import serializers
 from django.db import transaction
 from django.utils import timezone
 from .models import Customer, Sale, SaleDetail
-from applications.warehouse.models import Stock
+from applications.warehouse.models import Warehouse
+from applications.warehouse.allocation import (
+    STRATEGIES, DEFAULT_STRATEGY, allocate_sale
+)
+from applications.warehouse.reservations import available_to_sell
+from applications.warehouse.services import InsufficientStockError
 from applications.catalog.models import Product
+from applications.core.mixins import SparseFieldsMixin
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     total_purchases = serializers.SerializerMethodField()
 
     class Meta:
@@ -34,7 +40,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         return value.strip() if value else ''
 
 
-class SaleDetailSerializer(serializers.ModelSerializer):
+class SaleDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
 
@@ -57,10 +63,30 @@ class SaleDetailSerializer(serializers.ModelSerializer):
         return value
 
 
-class SaleSerializer(serializers.ModelSerializer):
+def sale_lines(details):
+    """{product_id: cantidad total} a partir de los detalles validados"""
+    lines = {}
+    for detail in details:
+        product_id = detail['product'].id
+        lines[product_id] = lines.get(product_id, 0) + detail['quantity']
+    return lines
+
+
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     details = SaleDetailSerializer(many=True)
+    allocation_strategy = serializers.ChoiceField(
+        choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY, write_only=True
+    )
+    preferred_warehouse = serializers.PrimaryKeyRelatedField(
+        queryset=Warehouse.objects.filter(is_active=True),
+        required=False, allow_null=True, write_only=True
+    )
+    # Carrito con retenciones (ver /stock-reservations/); se confirman al vender
+    cart = serializers.CharField(
+        max_length=64, required=False, allow_blank=True, write_only=True
+    )
 
     class Meta:
         model = Sale
@@ -68,6 +94,7 @@ class SaleSerializer(serializers.ModelSerializer):
             'id', 'customer', 'customer_name',
             'invoice_number', 'sale_date', 'total_amount',
             'created_by', 'created_by_name', 'details',
+            'allocation_strategy', 'preferred_warehouse', 'cart',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at', 'created_by']
@@ -93,20 +120,21 @@ class SaleSerializer(serializers.ModelSerializer):
                 'details': 'Debe incluir al menos un producto'
             })
 
-        # Validar stock disponible ANTES de crear la venta
+        # Validar stock disponible ANTES de crear la venta (una sola consulta);
+        # lo retenido por otros carritos no está disponible
+        requested = sale_lines(details)
+        totals = {}
+        for (product_id, _), available in available_to_sell(
+            requested, exclude_cart=data.get('cart')
+        ).items():
+            totals[product_id] = totals.get(product_id, 0) + max(available, 0)
         for detail in details:
             product = detail['product']
-            quantity = detail['quantity']
-            
-            # Obtener stock total del producto
-            total_stock = Stock.objects.filter(
-                product=product
-            ).aggregate(total=models.Sum('quantity'))['total'] or 0
-            
-            if total_stock < quantity:
+            total_stock = totals.get(product.id) or 0
+            if total_stock < requested[product.id]:
                 raise serializers.ValidationError({
                     'details': f"Stock insuficiente para {product.name}. "
-                               f"Disponible: {total_stock}, Solicitado: {quantity}"
+                               f"Disponible: {total_stock}, Solicitado: {requested[product.id]}"
                 })
 
         # Validar que el total coincida con la suma de subtotales
@@ -128,51 +156,39 @@ class SaleSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Crear venta con transacción atómica"""
         details_data = validated_data.pop('details', [])
+        strategy = validated_data.pop('allocation_strategy', DEFAULT_STRATEGY)
+        preferred = validated_data.pop('preferred_warehouse', None)
+        cart = validated_data.pop('cart', None)
         
         # Crear la venta
         sale = Sale.objects.create(**validated_data)
 
-        # Crear detalles y actualizar stock
-        for detail_data in details_data:
-            product = detail_data['product']
-            quantity = detail_data['quantity']
-            unit_price = detail_data['unit_price']
-            subtotal = quantity * unit_price
-
-            # Crear detalle
-            SaleDetail.objects.create(
+        # Crear detalles en un solo INSERT; el stock se descuenta abajo
+        # con un único asiento de inventario para toda la venta
+        SaleDetail.objects.bulk_create([
+            SaleDetail(
                 sale=sale,
-                product=product,
-                quantity=quantity,
-                unit_price=unit_price,
-                subtotal=subtotal
+                product=detail_data['product'],
+                quantity=detail_data['quantity'],
+                unit_price=detail_data['unit_price'],
+                subtotal=detail_data['quantity'] * detail_data['unit_price']
             )
+            for detail_data in details_data
+        ])
 
-            # Reducir stock (tomando del primer almacén con stock disponible)
-            stocks = Stock.objects.filter(
-                product=product, 
-                quantity__gt=0
-            ).order_by('-quantity')
-
-            remaining = quantity
-            for stock in stocks:
-                if remaining <= 0:
-                    break
-                
-                if stock.quantity >= remaining:
-                    stock.quantity -= remaining
-                    stock.save()
-                    remaining = 0
-                else:
-                    remaining -= stock.quantity
-                    stock.quantity = 0
-                    stock.save()
-
-            if remaining > 0:
-                # Esto no debería pasar por la validación previa, pero por seguridad
-                raise serializers.ValidationError(
-                    f"Error al descontar stock de {product.name}"
-                )
+        try:
+            allocate_sale(
+                sale, sale_lines(details_data), strategy, cart=cart or None,
+                preferred_warehouse=preferred.pk if preferred else None
+            )
+        except InsufficientStockError as exc:
+            # El stock cambió entre la validación y el bloqueo
+            names = {d['product'].id: d['product'].name for d in details_data}
+            raise serializers.ValidationError({'details': [
+                f"Stock insuficiente para {names[item['product']]}. "
+                f"Disponible: {item['available']}, Solicitado: {item['requested']}"
+                for item in exc.shortages
+            ]})
 
         return sale
 
@@ -189,4 +205,22 @@ class SaleSerializer(serializers.ModelSerializer):
         instance.invoice_number = validated_data.get('invoice_number', instance.invoice_number)
         instance.save()
         
-        return instance
\ No newline at end of file
+        return instance
+
+
+class AllocationPlanLineSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.filter(is_deleted=False))
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class AllocationPlanSerializer(serializers.Serializer):
+    """Entrada del plan de asignación (simulación, no descuenta stock)"""
+    details = AllocationPlanLineSerializer(many=True, allow_empty=False)
+    allocation_strategy = serializers.ChoiceField(
+        choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY
+    )
+    preferred_warehouse = serializers.PrimaryKeyRelatedField(
+        queryset=Warehouse.objects.filter(is_active=True),
+        required=False, allow_null=True
+    )
+    cart = serializers.CharField(max_length=64, required=False, allow_blank=True)
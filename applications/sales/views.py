@@ -8,7 +8,14 @@ from django.utils import timezone
 
 from .models import Customer, Sale, SaleDetail
 from applications.users.permissions import IsAdminOrVendedor
-from .serializers import CustomerSerializer, SaleSerializer, SaleDetailSerializer
+from applications.core.pagination import SelectablePagination
+from applications.core.mixins import SparseFieldsViewMixin
+from .serializers import (
+    CustomerSerializer, SaleSerializer, SaleDetailSerializer,
+    AllocationPlanSerializer, sale_lines
+)
+from applications.warehouse.allocation import plan_allocation
+from applications.warehouse.models import Warehouse
 
 
 # ===============================
@@ -28,21 +35,60 @@ class CustomerViewSet(viewsets.ModelViewSet):
 # ===============================
 #   SALE VIEWSET
 # ===============================
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """💰 ViewSet para gestión de ventas"""
-    queryset = Sale.objects.select_related('customer', 'created_by').prefetch_related('details__product').all()
+    queryset = Sale.objects.all()
     serializer_class = SaleSerializer
+    select_related_fields = {
+        'customer_name': 'customer',
+        'created_by_name': 'created_by',
+    }
+    prefetch_related_fields = {'details': 'details__product'}
     permission_classes = [IsAdminOrVendedor]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['customer', 'sale_date']
     search_fields = ['invoice_number', 'customer__name']
     ordering_fields = ['sale_date', 'total_amount', 'created_at']
     ordering = ['-sale_date', '-created_at']
+    pagination_class = SelectablePagination
+    cursor_ordering = ('-created_at', '-id')
 
     def perform_create(self, serializer):
         """Asignar usuario actual al crear venta"""
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['post'], serializer_class=AllocationPlanSerializer)
+    def allocation_plan(self, request):
+        """🧮 Simula de qué almacenes saldría cada línea (no descuenta stock)"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        preferred = data.get('preferred_warehouse')
+
+        allocations, shortages = plan_allocation(
+            sale_lines(data['details']),
+            data['allocation_strategy'],
+            cart=data.get('cart') or None,
+            preferred_warehouse=preferred.pk if preferred else None
+        )
+        warehouses = Warehouse.objects.only('name').in_bulk(
+            {allocation.warehouse_id for allocation in allocations}
+        )
+        return Response({
+            'strategy': data['allocation_strategy'],
+            'fulfillable': not shortages,
+            'allocations': [
+                {
+                    'product': allocation.product_id,
+                    'warehouse': allocation.warehouse_id,
+                    'warehouse_name': warehouses[allocation.warehouse_id].name,
+                    'quantity': allocation.quantity,
+                }
+                for allocation in allocations
+            ],
+            'shortages': shortages
+        })
+
     @action(detail=False, methods=['get'])
     def today(self, request):
         """📅 Ventas del día actual"""
@@ -81,10 +127,14 @@ class SaleViewSet(viewsets.ModelViewSet):
 # ===============================
 #   SALE DETAIL VIEWSET
 # ===============================
-class SaleDetailViewSet(viewsets.ReadOnlyModelViewSet):
+class SaleDetailViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """🧾 ViewSet de solo lectura para detalles de venta"""
-    queryset = SaleDetail.objects.select_related('sale', 'product', 'sale__customer').all()
+    queryset = SaleDetail.objects.all()
     serializer_class = SaleDetailSerializer
+    select_related_fields = {
+        'product_name': 'product',
+        'product_sku': 'product',
+    }
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['sale', 'product']
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.utils import timezone
+
+from applications.core.models import Notification
+from applications.catalog.models import Product
+from applications.users.models import User
+
+ALERT_ROLES = (User.ADMIN, User.ALMACENERO)
+
+
+def notify_low_stock(product_ids):
+    """
+    Avisa a admins y almaceneros de los productos que acaban de cruzar su
+    stock mínimo. Se envía al confirmar la transacción, con un solo INSERT,
+    y la clave (usuario, producto, día) evita repetir el aviso en el día.
+    Con robust=True un fallo del aviso se registra en el log y no convierte
+    en error una venta o compra ya confirmada.
+    """
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _create_notifications(product_ids), robust=True)
+
+
+def _create_notifications(product_ids):
+    users = list(User.objects.filter(
+        role__in=ALERT_ROLES, is_active=True
+    ).values_list('pk', flat=True))
+    if not users:
+        return
+    products = Product.objects.filter(pk__in=product_ids).values_list(
+        'pk', 'sku', 'name', 'min_stock', 'stock_summary__total_quantity'
+    )
+    today = timezone.localdate()
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
+            key=f"low_stock:{product_id}:{today:%Y-%m-%d}",
+            message=f"Stock bajo: {name} ({sku}) tiene {total or 0} unidades; "
+                    f"mínimo {min_stock}",
+        )
+        for product_id, sku, name, min_stock, total in products
+        for user_id in users
+    ], ignore_conflicts=True)
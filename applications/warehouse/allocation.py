@@ -0,0 +1,119 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Stock
+from .reservations import held_quantity, commit as commit_reservations
+from .services import InsufficientStockError, post_inventory
+
+Candidate = namedtuple('Candidate', 'stock_id warehouse_id quantity created_at')
+Allocation = namedtuple('Allocation', 'stock_id product_id warehouse_id quantity')
+
+STRATEGIES = {}
+DEFAULT_STRATEGY = 'largest_first'
+
+
+def strategy(name):
+    """Registra una estrategia: f(candidatos, cantidad, **opciones) -> candidatos en orden"""
+    def register(func):
+        STRATEGIES[name] = func
+        return func
+    return register
+
+
+@strategy('largest_first')
+def largest_first(candidates, quantity, **options):
+    """El almacén con más stock primero (comportamiento histórico)"""
+    return sorted(candidates, key=lambda c: (-c.quantity, c.warehouse_id))
+
+
+@strategy('preferred_warehouse')
+def preferred_warehouse(candidates, quantity, preferred_warehouse=None, **options):
+    """El almacén indicado primero y luego el resto por mayor stock"""
+    return sorted(
+        largest_first(candidates, quantity),
+        key=lambda c: c.warehouse_id != preferred_warehouse
+    )
+
+
+@strategy('fifo')
+def fifo(candidates, quantity, **options):
+    """El stock registrado hace más tiempo primero"""
+    return sorted(candidates, key=lambda c: (c.created_at, c.stock_id))
+
+
+@strategy('minimize_split')
+def minimize_split(candidates, quantity, **options):
+    """
+    Si un almacén cubre toda la línea, el de menor stock que alcance
+    (deja libres los grandes); si no, mayor stock primero.
+    """
+    covering = [c for c in candidates if c.quantity >= quantity]
+    if covering:
+        return [min(covering, key=lambda c: (c.quantity, c.warehouse_id))]
+    return largest_first(candidates, quantity)
+
+
+def plan_allocation(lines, strategy=DEFAULT_STRATEGY, lock=False, cart=None, **options):
+    """
+    Reparte las líneas {product_id: cantidad} entre almacenes con una sola
+    lectura de Stock (bloqueada y ordenada por id si lock=True).
+    Solo se asigna lo no retenido por otros carritos (las retenciones de
+    `cart` son de esta venta). Retorna (asignaciones, faltantes) sin escribir nada.
+    """
+    order = STRATEGIES[strategy]
+    stocks = Stock.objects.filter(product_id__in=lines, quantity__gt=0)
+    if lock:
+        stocks = stocks.select_for_update(of=('self',)).order_by('pk')
+    stocks = stocks.annotate(available=F('quantity') - held_quantity(cart))
+
+    candidates = defaultdict(list)
+    for pk, product_id, warehouse_id, available, created_at in stocks.values_list(
+        'pk', 'product_id', 'warehouse_id', 'available', 'created_at'
+    ):
+        if available > 0:
+            candidates[product_id].append(Candidate(pk, warehouse_id, available, created_at))
+
+    allocations = []
+    shortages = []
+    for product_id in sorted(lines):
+        remaining = lines[product_id]
+        available = sum(c.quantity for c in candidates[product_id])
+        if available < remaining:
+            shortages.append({
+                'product': product_id, 'available': available, 'requested': remaining
+            })
+            continue
+        for candidate in order(candidates[product_id], remaining, **options):
+            if remaining <= 0:
+                break
+            take = min(candidate.quantity, remaining)
+            allocations.append(Allocation(
+                candidate.stock_id, product_id, candidate.warehouse_id, take
+            ))
+            remaining -= take
+    return allocations, shortages
+
+
+@transaction.atomic
+def allocate_sale(sale, lines, strategy=DEFAULT_STRATEGY, cart=None, **options):
+    """
+    Descuenta el stock de todas las líneas de una venta con un único
+    asiento de inventario (ver services.post_inventory) y confirma las
+    retenciones del carrito `cart`, si lo hay.
+    Lanza InsufficientStockError sin escribir nada si alguna línea no alcanza.
+    """
+    allocations, shortages = plan_allocation(
+        lines, strategy, lock=True, cart=cart, **options
+    )
+    if shortages:
+        raise InsufficientStockError(shortages)
+
+    post_inventory(
+        [(a.product_id, a.warehouse_id, -a.quantity) for a in allocations],
+        reference=f"SALE-{sale.pk}", user=sale.created_by
+    )
+    if cart:
+        commit_reservations(cart)
+    return allocations
@@ -0,0 +1,46 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.warehouse.partitions import (
+    list_partitions, archive_partition, route_default_rows
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta a CSV comprimido y elimina las particiones de movimientos '
+        'anteriores a un mes. Conserve fotos de stock (take_stock_snapshot) '
+        'posteriores al período archivado para las consultas as_of.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before', required=True,
+            help='Archiva los meses anteriores a este (YYYY-MM)'
+        )
+        parser.add_argument(
+            '--output-dir', default=str(settings.MOVEMENT_ARCHIVE_DIR),
+            help='Carpeta destino de los archivos .csv.gz'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Solo exporta; no desconecta ni elimina las particiones'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            before = datetime.datetime.strptime(options['before'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError('Mes inválido, use YYYY-MM')
+
+        # Meses que cayeron en la partición por defecto (cron atrasado)
+        for month in route_default_rows(before):
+            self.stdout.write(f'{month:%Y-%m}: filas movidas desde la partición por defecto')
+
+        months = [month for month in list_partitions() if month < before]
+        for month in months:
+            path = archive_partition(month, options['output_dir'], drop=not options['keep'])
+            self.stdout.write(f'{month:%Y-%m} -> {path}')
+        self.stdout.write(self.style.SUCCESS(f'{len(months)} particiones archivadas'))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from applications.warehouse.partitions import ensure_partitions, partition_name
+
+
+class Command(BaseCommand):
+    help = 'Crea por adelantado las particiones mensuales de movimientos (ejecutar desde cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=settings.MOVEMENT_PARTITION_MONTHS_AHEAD,
+            help='Meses futuros a cubrir además del actual'
+        )
+
+    def handle(self, *args, **options):
+        created = ensure_partitions(options['months'])
+        for month in created:
+            self.stdout.write(f'Creada {partition_name(month)}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} particiones creadas'))
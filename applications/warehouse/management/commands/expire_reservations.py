@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from applications.warehouse.reservations import expire_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        'Marca como vencidas las retenciones de stock cuyo plazo pasó. '
+        'Pensado para ejecutarse cada minuto (cron o similar)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.STOCK_RESERVATION_SWEEP_BATCH,
+            help='Retenciones por UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{expired} retenciones vencidas'))
@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from applications.warehouse.reconciliation import reconcile_stock, write_corrections
+
+
+class Command(BaseCommand):
+    help = 'Compara Stock con el historial de movimientos por almacén y reporta diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--warehouse', type=int, action='append', dest='warehouses',
+            help='ID de almacén a conciliar (se puede repetir). Por defecto, todos'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Procesos en paralelo (uno por almacén a la vez)'
+        )
+        parser.add_argument(
+            '--opening-date',
+            help='Usar la foto de stock de este día (YYYY-MM-DD) como saldo inicial'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Registra movimientos de conciliación para cada diferencia'
+        )
+
+    def handle(self, *args, **options):
+        opening_date = None
+        if options['opening_date']:
+            opening_date = parse_date(options['opening_date'])
+            if opening_date is None:
+                raise CommandError('Fecha inválida, use YYYY-MM-DD')
+
+        drifts = reconcile_stock(
+            options['warehouses'], workers=options['workers'], opening_date=opening_date
+        )
+        for drift in drifts:
+            self.stdout.write(
+                f"producto {drift['product']} @ almacén {drift['warehouse']}: "
+                f"stock {drift['stock']}, historial {drift['ledger']} ({drift['drift']:+d})"
+            )
+
+        if options['fix'] and drifts:
+            write_corrections(drifts)
+            self.stdout.write(self.style.SUCCESS(f'{len(drifts)} movimientos de conciliación registrados'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(drifts)} diferencias encontradas'))
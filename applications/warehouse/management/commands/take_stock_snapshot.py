@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from applications.warehouse.services import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Guarda la foto diaria de stock por producto y almacén (por defecto, la de ayer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Día a fotografiar (YYYY-MM-DD). Por defecto, ayer'
+        )
+        parser.add_argument(
+            '--days', type=int, default=1,
+            help='Cantidad de días hacia atrás desde --date, para completar huecos'
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError('Fecha inválida, use YYYY-MM-DD')
+        else:
+            day = timezone.localdate() - datetime.timedelta(days=1)
+        if day >= timezone.localdate():
+            raise CommandError('Solo se pueden fotografiar días ya cerrados')
+
+        for offset in range(options['days']):
+            current = day - datetime.timedelta(days=offset)
+            saved = take_stock_snapshot(current)
+            self.stdout.write(self.style.SUCCESS(f'{current}: {saved} registros guardados'))
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_summaries(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    Stock = apps.get_model('warehouse', 'Stock')
+    Movement = apps.get_model('warehouse', 'Movement')
+    ProductStockSummary = apps.get_model('warehouse', 'ProductStockSummary')
+
+    totals = {
+        row['product_id']: row
+        for row in Stock.objects.values('product_id').annotate(
+            total=Sum('quantity'),
+            warehouses=Count('id', filter=Q(quantity__gt=0))
+        )
+    }
+    last_movements = dict(
+        Movement.objects.values('product_id').annotate(
+            last=Max('created_at')
+        ).values_list('product_id', 'last')
+    )
+
+    summaries = []
+    for product_id, min_stock in Product.objects.values_list('id', 'min_stock').iterator():
+        row = totals.get(product_id, {})
+        total = row.get('total') or 0
+        summaries.append(ProductStockSummary(
+            product_id=product_id,
+            total_quantity=total,
+            warehouses_count=row.get('warehouses') or 0,
+            is_low=total <= min_stock,
+            last_movement_at=last_movements.get(product_id)
+        ))
+    ProductStockSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_alter_category_options_alter_product_options_and_more'),
+        ('warehouse', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='catalog.product')),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('warehouses_count', models.PositiveIntegerField(default=0)),
+                ('is_low', models.BooleanField(default=True)),
+                ('last_movement_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Stock Summary',
+                'verbose_name_plural': 'Product Stock Summaries',
+                'indexes': [models.Index(fields=['is_low'], name='warehouse_p_is_low_879700_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productimage_content_storage'),
+        ('warehouse', '0003_stock_transfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='catalog.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='warehouse.warehouse')),
+            ],
+            options={
+                'ordering': ['-date', 'warehouse', 'product'],
+                'indexes': [models.Index(fields=['date', 'warehouse'], name='warehouse_s_date_4bbd71_idx')],
+                'unique_together': {('date', 'product', 'warehouse')},
+            },
+        ),
+    ]
@@ -0,0 +1,140 @@
+import datetime
+
+from django.db import migrations
+
+
+COLUMNS = ('"id", "product_id", "warehouse_id", "type", "quantity", "reference", '
+           '"created_by_id", "created_at", "notes"')
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_movements(apps, schema_editor):
+    """
+    Reemplaza warehouse_movement por una tabla particionada por mes sobre
+    created_at. La PK en la base pasa a ser (id, created_at), como exige
+    PostgreSQL; para el ORM id sigue siendo la clave primaria.
+    """
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT min(created_at AT TIME ZONE 'UTC'), max(created_at AT TIME ZONE 'UTC') "
+            'FROM warehouse_movement'
+        )
+        first, last = cursor.fetchone()
+
+    current = month_start(datetime.datetime.now(datetime.timezone.utc))
+    month = month_start(first) if first else current
+    last_month = add_months(max(month_start(last) if last else current, current), 3)
+
+    execute('CREATE SEQUENCE "warehouse_movement_new_id_seq"')
+    execute(
+        'CREATE TABLE "warehouse_movement_new" ('
+        '"id" bigint NOT NULL DEFAULT nextval(\'warehouse_movement_new_id_seq\'), '
+        '"product_id" bigint NOT NULL, '
+        '"warehouse_id" bigint NOT NULL, '
+        '"type" varchar(3) NOT NULL, '
+        '"quantity" integer NOT NULL CHECK ("quantity" >= 0), '
+        '"reference" varchar(255) NULL, '
+        '"created_by_id" bigint NULL, '
+        '"created_at" timestamp with time zone NOT NULL, '
+        '"notes" text NULL, '
+        'CONSTRAINT "warehouse_movement_new_pkey" PRIMARY KEY ("id", "created_at")'
+        ') PARTITION BY RANGE ("created_at")'
+    )
+    execute('CREATE TABLE "warehouse_movement_default" PARTITION OF "warehouse_movement_new" DEFAULT')
+    while month <= last_month:
+        following = add_months(month, 1)
+        execute(
+            f'CREATE TABLE "warehouse_movement_p{month:%Y%m}" PARTITION OF "warehouse_movement_new" '
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{following:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = following
+
+    execute(f'INSERT INTO "warehouse_movement_new" ({COLUMNS}) SELECT {COLUMNS} FROM "warehouse_movement"')
+    execute(
+        'SELECT setval(\'warehouse_movement_new_id_seq\', '
+        'COALESCE((SELECT max("id") FROM "warehouse_movement_new"), 0) + 1, false)'
+    )
+    execute('DROP TABLE "warehouse_movement"')
+
+    execute('ALTER TABLE "warehouse_movement_new" RENAME TO "warehouse_movement"')
+    execute('ALTER TABLE "warehouse_movement" RENAME CONSTRAINT "warehouse_movement_new_pkey" TO "warehouse_movement_pkey"')
+    execute('ALTER SEQUENCE "warehouse_movement_new_id_seq" RENAME TO "warehouse_movement_id_seq"')
+    execute('ALTER SEQUENCE "warehouse_movement_id_seq" OWNED BY "warehouse_movement"."id"')
+    add_keys_and_indexes(execute)
+
+
+def unpartition_movements(apps, schema_editor):
+    """
+    Reversa: vuelve a una tabla simple con la PK (id) e identidad que creó
+    la migración 0001. Las particiones ya archivadas no vuelven.
+    """
+    execute = schema_editor.execute
+    execute(
+        'CREATE TABLE "warehouse_movement_plain" ('
+        '"id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY, '
+        '"type" varchar(3) NOT NULL, '
+        '"quantity" integer NOT NULL CHECK ("quantity" >= 0), '
+        '"reference" varchar(255) NULL, '
+        '"created_at" timestamp with time zone NOT NULL, '
+        '"notes" text NULL, '
+        '"created_by_id" bigint NULL, '
+        '"product_id" bigint NOT NULL, '
+        '"warehouse_id" bigint NOT NULL)'
+    )
+    execute(f'INSERT INTO "warehouse_movement_plain" ({COLUMNS}) SELECT {COLUMNS} FROM "warehouse_movement"')
+    execute(
+        'SELECT setval(pg_get_serial_sequence(\'"warehouse_movement_plain"\', \'id\'), '
+        'COALESCE((SELECT max("id") FROM "warehouse_movement_plain"), 0) + 1, false)'
+    )
+    # Elimina también las particiones y la secuencia propia
+    execute('DROP TABLE "warehouse_movement"')
+
+    execute('ALTER TABLE "warehouse_movement_plain" RENAME TO "warehouse_movement"')
+    execute('ALTER TABLE "warehouse_movement" RENAME CONSTRAINT "warehouse_movement_plain_pkey" TO "warehouse_movement_pkey"')
+    execute(
+        'ALTER TABLE "warehouse_movement" RENAME CONSTRAINT "warehouse_movement_plain_quantity_check" '
+        'TO "warehouse_movement_quantity_check"'
+    )
+    execute('ALTER SEQUENCE "warehouse_movement_plain_id_seq" RENAME TO "warehouse_movement_id_seq"')
+    add_keys_and_indexes(execute)
+
+
+def add_keys_and_indexes(execute):
+    # Mismos nombres que generó Django para que migraciones futuras los encuentren
+    for statement in (
+        'ALTER TABLE "warehouse_movement" ADD CONSTRAINT "warehouse_movement_product_id_aa7fd1e0_fk_catalog_product_id" '
+        'FOREIGN KEY ("product_id") REFERENCES "catalog_product" ("id") DEFERRABLE INITIALLY DEFERRED',
+        'ALTER TABLE "warehouse_movement" ADD CONSTRAINT "warehouse_movement_warehouse_id_da671e24_fk_warehouse" '
+        'FOREIGN KEY ("warehouse_id") REFERENCES "warehouse_warehouse" ("id") DEFERRABLE INITIALLY DEFERRED',
+        'ALTER TABLE "warehouse_movement" ADD CONSTRAINT "warehouse_movement_created_by_id_1575773a_fk_users_user_id" '
+        'FOREIGN KEY ("created_by_id") REFERENCES "users_user" ("id") DEFERRABLE INITIALLY DEFERRED',
+        'CREATE INDEX "warehouse_movement_product_id_aa7fd1e0" ON "warehouse_movement" ("product_id")',
+        'CREATE INDEX "warehouse_movement_warehouse_id_da671e24" ON "warehouse_movement" ("warehouse_id")',
+        'CREATE INDEX "warehouse_movement_type_e1c0d1c0" ON "warehouse_movement" ("type")',
+        'CREATE INDEX "warehouse_movement_type_e1c0d1c0_like" ON "warehouse_movement" ("type" varchar_pattern_ops)',
+        'CREATE INDEX "warehouse_movement_created_by_id_1575773a" ON "warehouse_movement" ("created_by_id")',
+        'CREATE INDEX "warehouse_m_created_9341a6_idx" ON "warehouse_movement" ("created_at" DESC)',
+        'CREATE INDEX "warehouse_m_product_9660d6_idx" ON "warehouse_movement" ("product_id", "warehouse_id")',
+        'CREATE INDEX "warehouse_m_type_abb686_idx" ON "warehouse_movement" ("type")',
+    ):
+        execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warehouse', '0004_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_movements, unpartition_movements),
+    ]
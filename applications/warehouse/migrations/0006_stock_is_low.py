@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:18
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_is_low(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    Stock = apps.get_model('warehouse', 'Stock')
+    Stock.objects.update(is_low=Exists(Product.objects.filter(
+        pk=OuterRef('product_id'), min_stock__gte=OuterRef('quantity')
+    )))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productimage_content_storage'),
+        ('warehouse', '0005_partition_movement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='is_low',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(backfill_is_low, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('is_low', True)), fields=['warehouse', 'product'], name='warehouse_stock_low_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('quantity', 0)), fields=['warehouse', 'product'], name='warehouse_stock_zero_idx'),
+        ),
+    ]
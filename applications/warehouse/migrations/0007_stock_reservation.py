@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:20
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productimage_content_storage'),
+        ('warehouse', '0006_stock_is_low'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('active', 'Activa'), ('released', 'Liberada'), ('committed', 'Confirmada'), ('expired', 'Vencida')], default='active', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_reservations', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='catalog.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='warehouse.warehouse')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'active')), fields=['product', 'warehouse', 'expires_at'], name='warehouse_reservation_hold_idx'), models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='warehouse_reservation_exp_idx'), models.Index(condition=models.Q(('status', 'active')), fields=['cart'], name='warehouse_reservation_cart_idx')],
+            },
+        ),
+    ]
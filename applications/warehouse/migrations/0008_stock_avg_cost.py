@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:21
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_avg_cost(apps, schema_editor):
+    """Punto de partida: costo promedio de todas las compras de cada (producto, almacén)"""
+    Stock = apps.get_model('warehouse', 'Stock')
+    PurchaseDetail = apps.get_model('purchases', 'PurchaseDetail')
+    cost = models.DecimalField(max_digits=14, decimal_places=4)
+    purchases = PurchaseDetail.objects.filter(
+        product_id=OuterRef('product_id'),
+        purchase__warehouse_id=OuterRef('warehouse_id')
+    ).order_by().values('product_id').annotate(
+        avg=ExpressionWrapper(
+            Sum(F('quantity') * F('cost_price')) / Sum('quantity'), output_field=cost
+        )
+    ).values('avg')
+    Stock.objects.update(avg_cost=Coalesce(Subquery(purchases, output_field=cost), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0001_initial'),
+        ('warehouse', '0007_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='avg_cost',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_avg_cost, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,20 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from applications.catalog.models import Product
 from applications.users.models import User
 
 
+class WarehouseQuerySet(models.QuerySet):
+    def with_stock_totals(self):
+        """Anota stock total y cantidad de productos con un solo GROUP BY"""
+        return self.annotate(
+            stock_total=Coalesce(models.Sum('stocks__quantity'), 0),
+            stock_products=models.Count('stocks')
+        )
+
+
 class Warehouse(models.Model):
     name = models.CharField(max_length=120, unique=True, db_index=True)
     location = models.CharField(max_length=255, blank=True)
@@ -17,6 +27,8 @@ class Warehouse(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WarehouseQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         indexes = [
@@ -29,9 +41,18 @@ class Warehouse(models.Model):
 
     def get_total_stock(self):
         """Retorna la cantidad total de productos en este almacén"""
-        return self.stocks.aggregate(
+        if hasattr(self, 'stock_total'):
+            return self.stock_total
+        self.stock_total = self.stocks.aggregate(
             total=models.Sum('quantity')
         )['total'] or 0
+        return self.stock_total
+
+    def get_products_count(self):
+        """Retorna cantidad de productos diferentes con registro de stock"""
+        if not hasattr(self, 'stock_products'):
+            self.stock_products = self.stocks.count()
+        return self.stock_products
 
     def get_capacity_used(self):
         """Retorna el porcentaje de capacidad utilizado"""
@@ -53,6 +74,12 @@ class Stock(models.Model):
         related_name='stocks'
     )
     quantity = models.IntegerField(default=0)  # Puede ser negativo temporalmente
+    # quantity <= product.min_stock; lo mantienen services.post_movements y
+    # refresh_low_stock_flags para no cruzar con Product en cada consulta
+    is_low = models.BooleanField(default=True)
+    # Costo unitario promedio ponderado; lo actualiza cada entrada con costo
+    # (compras, transferencias) en services.post_movements
+    avg_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -62,6 +89,15 @@ class Stock(models.Model):
         indexes = [
             models.Index(fields=['product', 'warehouse']),
             models.Index(fields=['quantity']),
+            # Parciales: solo contienen las filas bajas / agotadas
+            models.Index(
+                fields=['warehouse', 'product'], condition=models.Q(is_low=True),
+                name='warehouse_stock_low_idx'
+            ),
+            models.Index(
+                fields=['warehouse', 'product'], condition=models.Q(quantity=0),
+                name='warehouse_stock_zero_idx'
+            ),
         ]
 
     def __str__(self):
@@ -76,7 +112,36 @@ class Stock(models.Model):
 
     def is_low_stock(self):
         """Verifica si está por debajo del stock mínimo del producto"""
-        return self.quantity <= self.product.min_stock
+        return self.is_low
+
+
+class ProductStockSummary(models.Model):
+    """
+    Resumen desnormalizado del stock de un producto en todos los almacenes.
+    Lo mantienen las escrituras de inventario (ver services.update_stock_summaries)
+    para que los listados del catálogo no agreguen Stock fila por fila.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stock_summary'
+    )
+    total_quantity = models.IntegerField(default=0)
+    warehouses_count = models.PositiveIntegerField(default=0)
+    is_low = models.BooleanField(default=True)
+    last_movement_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Product Stock Summary'
+        verbose_name_plural = 'Product Stock Summaries'
+        indexes = [
+            models.Index(fields=['is_low']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.total_quantity}"
 
 
 class Movement(models.Model):
@@ -118,4 +183,151 @@ class Movement(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.product.name} {self.get_type_display()} ({self.quantity})"
\ No newline at end of file
+        return f"{self.product.name} {self.get_type_display()} ({self.quantity})"
+
+class StockTransfer(models.Model):
+    """Documento de transferencia de varias líneas entre dos almacenes"""
+    from_warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.PROTECT,
+        related_name='transfers_out'
+    )
+    to_warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.PROTECT,
+        related_name='transfers_in'
+    )
+    reference = models.CharField(max_length=255, blank=True)
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='transfers_created'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['from_warehouse', '-created_at']),
+            models.Index(fields=['to_warehouse', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"TRF-{self.id}: {self.from_warehouse_id} -> {self.to_warehouse_id}"
+
+
+class StockTransferLine(models.Model):
+    transfer = models.ForeignKey(
+        StockTransfer,
+        on_delete=models.CASCADE,
+        related_name='lines'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        related_name='transfer_lines'
+    )
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ('transfer', 'product')
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock por producto y almacén al cierre de un día (hora local).
+    Lo genera el comando take_stock_snapshot; las cantidades en cero no se
+    guardan. Ver services.stock_as_of para consultas a una fecha.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshots'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshots'
+    )
+    date = models.DateField()
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', 'warehouse', 'product']
+        unique_together = ('date', 'product', 'warehouse')
+        indexes = [
+            models.Index(fields=['date', 'warehouse']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} @ {self.warehouse_id}: {self.quantity}"
+
+
+class StockReservation(models.Model):
+    """
+    Retención temporal de stock para un carrito en curso. Solo las activas y
+    no vencidas restan del disponible para vender (ver reservations.py);
+    el comando expire_reservations marca las vencidas por lotes.
+    """
+    ACTIVE = 'active'
+    RELEASED = 'released'
+    COMMITTED = 'committed'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = (
+        (ACTIVE, 'Activa'),
+        (RELEASED, 'Liberada'),
+        (COMMITTED, 'Confirmada'),
+        (EXPIRED, 'Vencida')
+    )
+
+    cart = models.CharField(max_length=64)
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ACTIVE)
+    expires_at = models.DateTimeField()
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='stock_reservations'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Parciales: solo las activas, que son las que se consultan
+            models.Index(
+                fields=['product', 'warehouse', 'expires_at'],
+                condition=models.Q(status='active'),
+                name='warehouse_reservation_hold_idx'
+            ),
+            models.Index(
+                fields=['expires_at'], condition=models.Q(status='active'),
+                name='warehouse_reservation_exp_idx'
+            ),
+            models.Index(
+                fields=['cart'], condition=models.Q(status='active'),
+                name='warehouse_reservation_cart_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.cart}: {self.product_id} @ {self.warehouse_id} x{self.quantity}"
@@ -0,0 +1,153 @@
+"""
+Particionado mensual (RANGE sobre created_at, meses UTC) de warehouse_movement.
+
+La tabla padre se crea en la migración 0005. Cada mes vive en
+warehouse_movement_pAAAAMM y warehouse_movement_default recibe lo que no
+tenga partición propia, así que un INSERT nunca falla aunque el cron que
+crea particiones futuras se haya atrasado. El ORM de Movement no cambia.
+"""
+import datetime
+import gzip
+import os
+import re
+
+from django.db import connection, transaction
+
+from .models import Movement
+
+PARENT_TABLE = Movement._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_RE = re.compile(rf'^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y%m}'
+
+
+def _bounds(month):
+    return (f"{month:%Y-%m-%d} 00:00:00+00", f"{add_months(month, 1):%Y-%m-%d} 00:00:00+00")
+
+
+def list_partitions():
+    """Meses con partición propia, en orden"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+@transaction.atomic
+def create_partition(month):
+    """
+    Crea la partición del mes si no existe. Si la partición por defecto ya
+    tiene filas de ese mes, se desconecta, se mueven las filas y se vuelve a
+    conectar (PostgreSQL no permite crear la partición con filas en conflicto).
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    lower, upper = _bounds(month)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" '
+            f'WHERE created_at >= %s AND created_at < %s)',
+            [lower, upper]
+        )
+        pending = cursor.fetchone()[0]
+        if pending:
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{PARENT_TABLE}" '
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+
+        if pending:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                f'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+                f'INSERT INTO "{PARENT_TABLE}" SELECT * FROM moved',
+                [lower, upper]
+            )
+            cursor.execute(
+                f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT'
+            )
+    return True
+
+
+def default_partition_months():
+    """Meses (UTC) con filas en la partición por defecto"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+            f'FROM "{DEFAULT_PARTITION}" ORDER BY 1'
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def route_default_rows(before):
+    """
+    Da partición propia a los meses anteriores a `before` que solo tienen
+    filas en la partición por defecto (create_partition las mueve), para
+    que archive_partition pueda exportarlos. Retorna los meses creados.
+    """
+    return [
+        month for month in default_partition_months()
+        if month < before and create_partition(month)
+    ]
+
+
+def ensure_partitions(months_ahead, today=None):
+    """Crea las particiones del mes actual y de los `months_ahead` siguientes"""
+    current = month_start(today or datetime.datetime.now(datetime.timezone.utc))
+    return [
+        month for month in (add_months(current, offset) for offset in range(months_ahead + 1))
+        if create_partition(month)
+    ]
+
+
+def archive_partition(month, output_dir, drop=True):
+    """
+    Exporta la partición del mes a <output_dir>/<partición>.csv.gz (COPY) y
+    luego la desconecta y elimina. Si la exportación falla no se toca nada.
+    Solo lee la partición del mes: las filas de ese mes que sigan en la
+    partición por defecto se mueven antes con route_default_rows.
+    """
+    name = partition_name(month)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'{name}.csv.gz')
+
+    with connection.cursor() as cursor:
+        with gzip.open(path, 'wt', encoding='utf-8') as output:
+            cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', output)
+
+    if drop:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+    return path
@@ -0,0 +1,100 @@
+"""
+Conciliación de Stock contra el historial de movimientos.
+
+Para cada (producto, almacén) se compara Stock.quantity con el saldo del
+historial (entradas - salidas, con un GROUP BY por almacén). Los almacenes
+se reparten entre procesos; las correcciones son movimientos que ajustan el
+historial al stock registrado, sin modificar Stock.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, connections, transaction
+
+from .models import Stock, Movement, StockSnapshot, Warehouse
+from .services import _net_movements, end_of_day
+
+RECONCILIATION_REFERENCE = 'CONCILIACION'
+
+
+def reconcile_warehouse(warehouse_id, opening_date=None):
+    """
+    Diferencias de un almacén: [{product, warehouse, stock, ledger, drift}].
+    Con `opening_date` el saldo inicial es la foto de ese día y solo se suman
+    los movimientos posteriores (necesario tras archivar particiones).
+    """
+    ledger = {}
+    since = None
+    if opening_date is not None:
+        ledger = {
+            (product_id, warehouse_id): quantity
+            for product_id, quantity in StockSnapshot.objects.filter(
+                date=opening_date, warehouse_id=warehouse_id
+            ).values_list('product_id', 'quantity')
+        }
+        since = end_of_day(opening_date)
+    for key, net in _net_movements(since=since, warehouse_ids=[warehouse_id]).items():
+        ledger[key] = ledger.get(key, 0) + net
+
+    stock = {
+        (product_id, warehouse_id): quantity
+        for product_id, quantity in Stock.objects.filter(
+            warehouse_id=warehouse_id
+        ).values_list('product_id', 'quantity')
+    }
+
+    drifts = []
+    for key in sorted(stock.keys() | ledger.keys()):
+        expected = ledger.get(key, 0)
+        actual = stock.get(key, 0)
+        if actual != expected:
+            drifts.append({
+                'product': key[0], 'warehouse': key[1],
+                'stock': actual, 'ledger': expected, 'drift': actual - expected,
+            })
+    return drifts
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _reconcile_shard(args):
+    warehouse_id, opening_date = args
+    try:
+        return reconcile_warehouse(warehouse_id, opening_date)
+    finally:
+        connection.close()
+
+
+def reconcile_stock(warehouse_ids=None, workers=1, opening_date=None):
+    """Concilia los almacenes indicados (o todos), en paralelo si workers > 1"""
+    if warehouse_ids is None:
+        warehouse_ids = list(Warehouse.objects.order_by('pk').values_list('pk', flat=True))
+    shards = [(warehouse_id, opening_date) for warehouse_id in warehouse_ids]
+
+    if workers > 1 and len(shards) > 1:
+        # Un proceso hijo no debe heredar el socket abierto del padre
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = list(pool.map(_reconcile_shard, shards))
+    else:
+        results = [reconcile_warehouse(*shard) for shard in shards]
+    return [drift for result in results for drift in result]
+
+
+@transaction.atomic
+def write_corrections(drifts, user=None):
+    """Inserta un movimiento por diferencia para que el historial cuadre con Stock"""
+    return Movement.objects.bulk_create([
+        Movement(
+            product_id=drift['product'], warehouse_id=drift['warehouse'],
+            type=Movement.IN if drift['drift'] > 0 else Movement.OUT,
+            quantity=abs(drift['drift']), reference=RECONCILIATION_REFERENCE,
+            notes=f"Conciliación: stock {drift['stock']}, historial {drift['ledger']}",
+            created_by=user
+        )
+        for drift in drifts
+    ], batch_size=1000)
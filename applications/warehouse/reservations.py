@@ -0,0 +1,143 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, Subquery, OuterRef, IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Stock, StockReservation
+from .services import InsufficientStockError
+
+
+def active_holds(now=None):
+    """Retenciones que restan del disponible en este momento"""
+    return StockReservation.objects.filter(
+        status=StockReservation.ACTIVE, expires_at__gt=now or timezone.now()
+    )
+
+
+def held_quantity(exclude_cart=None, now=None):
+    """
+    Unidades retenidas del Stock exterior (producto, almacén), como
+    subconsulta correlacionada sobre el índice parcial de retenciones activas.
+    Las del carrito `exclude_cart` no cuentan: son suyas.
+    """
+    holds = active_holds(now).filter(
+        product_id=OuterRef('product_id'), warehouse_id=OuterRef('warehouse_id')
+    )
+    if exclude_cart:
+        holds = holds.exclude(cart=exclude_cart)
+    return Coalesce(
+        Subquery(
+            holds.order_by().values('product_id').annotate(
+                total=Sum('quantity')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def available_to_sell(product_ids, exclude_cart=None):
+    """{(producto, almacén): cantidad - retenido} con una sola consulta"""
+    return {
+        (product_id, warehouse_id): available
+        for product_id, warehouse_id, available in Stock.objects.filter(
+            product_id__in=product_ids
+        ).annotate(
+            available=F('quantity') - held_quantity(exclude_cart)
+        ).values_list('product_id', 'warehouse_id', 'available')
+    }
+
+
+@transaction.atomic
+def reserve(cart, lines, user=None, ttl=None):
+    """
+    Fija la retención del carrito en cada (producto, almacén) de `lines`
+    ({(product_id, warehouse_id): cantidad}): reemplaza la anterior y renueva
+    el vencimiento; cantidad 0 la libera. Las filas de Stock se bloquean
+    ordenadas por id, así dos terminales no retienen las mismas unidades.
+    Lanza InsufficientStockError sin escribir nada si algo no alcanza.
+    """
+    lines = dict(sorted(lines.items()))
+    product_ids = {product_id for product_id, _ in lines}
+    warehouse_ids = {warehouse_id for _, warehouse_id in lines}
+    now = timezone.now()
+
+    available = {
+        (product_id, warehouse_id): quantity
+        for product_id, warehouse_id, quantity in Stock.objects.select_for_update(
+            of=('self',)
+        ).filter(
+            product_id__in=product_ids, warehouse_id__in=warehouse_ids
+        ).order_by('pk').annotate(
+            available=F('quantity') - held_quantity(cart, now)
+        ).values_list('product_id', 'warehouse_id', 'available')
+    }
+    shortages = [
+        {'product': product_id, 'warehouse': warehouse_id,
+         'available': max(available.get((product_id, warehouse_id), 0), 0),
+         'requested': quantity}
+        for (product_id, warehouse_id), quantity in lines.items()
+        if available.get((product_id, warehouse_id), 0) < quantity
+    ]
+    if shortages:
+        raise InsufficientStockError(shortages)
+
+    previous = [
+        pk for pk, product_id, warehouse_id in active_holds(now).filter(
+            cart=cart, product_id__in=product_ids, warehouse_id__in=warehouse_ids
+        ).values_list('pk', 'product_id', 'warehouse_id')
+        if (product_id, warehouse_id) in lines
+    ]
+    StockReservation.objects.filter(pk__in=previous).update(
+        status=StockReservation.RELEASED
+    )
+
+    expires_at = now + datetime.timedelta(
+        seconds=ttl or settings.STOCK_RESERVATION_TTL
+    )
+    return StockReservation.objects.bulk_create([
+        StockReservation(
+            cart=cart, product_id=product_id, warehouse_id=warehouse_id,
+            quantity=quantity, expires_at=expires_at, created_by=user
+        )
+        for (product_id, warehouse_id), quantity in lines.items() if quantity
+    ])
+
+
+def release(cart, product_ids=None):
+    """Libera las retenciones activas del carrito (o solo las de esos productos)"""
+    holds = StockReservation.objects.filter(cart=cart, status=StockReservation.ACTIVE)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    return holds.update(status=StockReservation.RELEASED)
+
+
+def commit(cart):
+    """Marca como confirmadas las retenciones del carrito al cerrar la venta"""
+    return StockReservation.objects.filter(
+        cart=cart, status=StockReservation.ACTIVE
+    ).update(status=StockReservation.COMMITTED)
+
+
+def expire_reservations(batch_size=None, now=None):
+    """
+    Marca como vencidas las retenciones activas cuyo plazo pasó, en lotes de
+    `batch_size` para no mantener bloqueos largos. Las vencidas ya no restan
+    del disponible aunque no se hayan barrido; esto mantiene chico el índice
+    parcial de activas. Retorna cuántas se marcaron.
+    """
+    batch_size = batch_size or settings.STOCK_RESERVATION_SWEEP_BATCH
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        batch = list(StockReservation.objects.filter(
+            status=StockReservation.ACTIVE, expires_at__lte=now
+        ).order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return expired
+        expired += StockReservation.objects.filter(
+            pk__in=batch, status=StockReservation.ACTIVE
+        ).update(status=StockReservation.EXPIRED)
@@ -1,10 +1,16 @@
 from rest_framework import serializers
-from django.db import transaction
-from .models import Warehouse, Stock, Movement
+from .models import (
+    Warehouse, Stock, Movement, StockTransfer, StockTransferLine, StockReservation
+)
+from .reservations import reserve
+from .services import (
+    transfer_stock, post_inventory, post_movements, set_stock_level, InsufficientStockError
+)
 from applications.catalog.models import Product
+from applications.core.mixins import SparseFieldsMixin
 
 
-class WarehouseSerializer(serializers.ModelSerializer):
+class WarehouseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     total_stock = serializers.SerializerMethodField()
     capacity_used = serializers.SerializerMethodField()
     products_count = serializers.SerializerMethodField()
@@ -26,7 +32,7 @@ class WarehouseSerializer(serializers.ModelSerializer):
 
     def get_products_count(self, obj):
         """Retorna cantidad de productos diferentes"""
-        return obj.stocks.count()
+        return obj.get_products_count()
 
     def validate_name(self, value):
         """Valida que el nombre no esté vacío"""
@@ -41,23 +47,19 @@ class WarehouseSerializer(serializers.ModelSerializer):
         return value
 
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
     warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
-    is_low_stock = serializers.SerializerMethodField()
+    is_low_stock = serializers.BooleanField(source='is_low', read_only=True)
     min_stock = serializers.IntegerField(source='product.min_stock', read_only=True)
 
     class Meta:
         model = Stock
         fields = ['id', 'product', 'product_name', 'product_sku',
                   'warehouse', 'warehouse_name', 'quantity', 
-                  'is_low_stock', 'min_stock', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
-
-    def get_is_low_stock(self, obj):
-        """Indica si está bajo de stock"""
-        return obj.is_low_stock()
+                  'is_low_stock', 'min_stock', 'avg_cost', 'created_at', 'updated_at']
+        read_only_fields = ['avg_cost', 'created_at', 'updated_at']
 
     def validate_quantity(self, value):
         """Valida que la cantidad no sea negativa"""
@@ -78,8 +80,33 @@ class StockSerializer(serializers.ModelSerializer):
         
         return data
 
+    def create(self, validated_data):
+        """El stock solo cambia mediante un movimiento de ajuste"""
+        return set_stock_level(
+            validated_data['product'].pk, validated_data['warehouse'].pk,
+            validated_data.get('quantity', 0), user=self.get_request_user()
+        )
+
+    def update(self, instance, validated_data):
+        """Solo se ajusta la cantidad; producto y almacén no cambian"""
+        for field in ('product', 'warehouse'):
+            if field in validated_data and validated_data[field] != getattr(instance, field):
+                raise serializers.ValidationError({
+                    field: 'No se puede cambiar; cree un nuevo registro de stock'
+                })
+        if 'quantity' not in validated_data:
+            return instance
+        return set_stock_level(
+            instance.product_id, instance.warehouse_id,
+            validated_data['quantity'], user=self.get_request_user()
+        )
+
+    def get_request_user(self):
+        request = self.context.get('request')
+        return request.user if request else None
+
 
-class MovementSerializer(serializers.ModelSerializer):
+class MovementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
     warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
@@ -132,31 +159,240 @@ class MovementSerializer(serializers.ModelSerializer):
 
         return data
 
-    @transaction.atomic
     def create(self, validated_data):
-        """Crear movimiento y actualizar stock automáticamente"""
-        # Crear el movimiento
-        movement = Movement.objects.create(**validated_data)
-
-        # Actualizar o crear stock
-        stock, created = Stock.objects.get_or_create(
-            product=movement.product,
-            warehouse=movement.warehouse,
-            defaults={'quantity': 0}
-        )
+        """Registrar el movimiento y actualizar stock vía post_inventory"""
+        quantity = validated_data['quantity']
+        delta = quantity if validated_data['type'] == Movement.IN else -quantity
+        try:
+            movements = post_inventory(
+                [(validated_data['product'].pk, validated_data['warehouse'].pk, delta)],
+                reference=validated_data.get('reference'),
+                user=validated_data.get('created_by'),
+                notes=validated_data.get('notes')
+            )
+        except InsufficientStockError as exc:
+            raise serializers.ValidationError({
+                'quantity': f"Stock insuficiente. Disponible: {exc.shortages[0]['available']}"
+            })
+        return movements[0]
 
-        # Actualizar cantidad según tipo de movimiento
-        if movement.type == Movement.IN:
-            stock.quantity += movement.quantity
-        elif movement.type == Movement.OUT:
-            stock.quantity -= movement.quantity
-            
-            # Validar que no quede negativo
-            if stock.quantity < 0:
-                raise serializers.ValidationError({
-                    'quantity': f'Operación dejaría el stock negativo: {stock.quantity}'
-                })
 
-        stock.save()
+class StockTransferLineSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+
+    class Meta:
+        model = StockTransferLine
+        fields = ['id', 'product', 'product_name', 'product_sku', 'quantity']
+
+    def validate_quantity(self, value):
+        """Valida que la cantidad sea mayor a 0"""
+        if value <= 0:
+            raise serializers.ValidationError("La cantidad debe ser mayor a 0")
+        return value
+
+
+class StockTransferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    from_warehouse_name = serializers.CharField(source='from_warehouse.name', read_only=True)
+    to_warehouse_name = serializers.CharField(source='to_warehouse.name', read_only=True)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+    lines = StockTransferLineSerializer(many=True)
+
+    MAX_LINES = 1000
+
+    class Meta:
+        model = StockTransfer
+        fields = [
+            'id', 'from_warehouse', 'from_warehouse_name',
+            'to_warehouse', 'to_warehouse_name', 'reference', 'notes',
+            'lines', 'created_by', 'created_by_username', 'created_at'
+        ]
+        read_only_fields = ['created_by', 'created_at']
+
+    def validate_from_warehouse(self, value):
+        """Valida que el almacén esté activo"""
+        if not value.is_active:
+            raise serializers.ValidationError("El almacén no está activo")
+        return value
 
-        return movement
\ No newline at end of file
+    def validate_to_warehouse(self, value):
+        """Valida que el almacén esté activo"""
+        if not value.is_active:
+            raise serializers.ValidationError("El almacén no está activo")
+        return value
+
+    def validate_lines(self, value):
+        """Al menos una línea, sin productos repetidos"""
+        if not value:
+            raise serializers.ValidationError("Debe incluir al menos un producto")
+        if len(value) > self.MAX_LINES:
+            raise serializers.ValidationError(
+                f"Máximo {self.MAX_LINES} líneas por transferencia"
+            )
+        product_ids = [line['product'].id for line in value]
+        if len(product_ids) != len(set(product_ids)):
+            raise serializers.ValidationError(
+                "No puede incluir el mismo producto más de una vez"
+            )
+        return value
+
+    def validate(self, data):
+        if data['from_warehouse'] == data['to_warehouse']:
+            raise serializers.ValidationError({
+                'to_warehouse': 'Los almacenes de origen y destino deben ser diferentes'
+            })
+        return data
+
+    def create(self, validated_data):
+        """Aplica la transferencia completa en una sola transacción"""
+        products = {line['product'].id: line for line in validated_data.pop('lines')}
+        lines = {pid: line['quantity'] for pid, line in products.items()}
+        try:
+            return transfer_stock(
+                lines=lines,
+                user=validated_data.pop('created_by', None),
+                **validated_data
+            )
+        except InsufficientStockError as exc:
+            raise serializers.ValidationError({
+                'lines': [
+                    f"{products[item['product']]['product'].sku}: stock insuficiente. "
+                    f"Disponible: {item['available']}, Solicitado: {item['requested']}"
+                    for item in exc.shortages
+                ]
+            })
+
+
+
+class MovementBatchItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    warehouse = serializers.IntegerField()
+    type = serializers.ChoiceField(choices=Movement.TYPE_CHOICES)
+    quantity = serializers.IntegerField(min_value=1)
+    reference = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class MovementBatchSerializer(serializers.Serializer):
+    """
+    Lote de movimientos (p. ej. una sesión de recepción de un lector).
+    Productos y almacenes se validan con una consulta cada uno y el lote se
+    aplica completo o nada.
+    """
+    movements = MovementBatchItemSerializer(many=True, allow_empty=False)
+    reference = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    MAX_MOVEMENTS = 1000
+
+    def validate_movements(self, value):
+        if len(value) > self.MAX_MOVEMENTS:
+            raise serializers.ValidationError(
+                f"Máximo {self.MAX_MOVEMENTS} movimientos por lote"
+            )
+
+        products = set(Product.objects.filter(
+            pk__in={item['product'] for item in value}, is_deleted=False
+        ).values_list('pk', flat=True))
+        warehouses = set(Warehouse.objects.filter(
+            pk__in={item['warehouse'] for item in value}, is_active=True
+        ).values_list('pk', flat=True))
+
+        errors = {}
+        for index, item in enumerate(value):
+            item_errors = {}
+            if item['product'] not in products:
+                item_errors['product'] = 'El producto no existe'
+            if item['warehouse'] not in warehouses:
+                item_errors['warehouse'] = 'El almacén no existe o no está activo'
+            if item_errors:
+                errors[index] = item_errors
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+    def create(self, validated_data):
+        """Inserta todos los movimientos y aplica el neto por (producto, almacén)"""
+        default_reference = validated_data.get('reference') or None
+        user = validated_data.get('created_by')
+        try:
+            return post_movements([
+                Movement(
+                    product_id=item['product'], warehouse_id=item['warehouse'],
+                    type=item['type'], quantity=item['quantity'],
+                    reference=item.get('reference') or default_reference,
+                    notes=item.get('notes') or None, created_by=user
+                )
+                for item in validated_data['movements']
+            ])
+        except InsufficientStockError as exc:
+            raise serializers.ValidationError({
+                'movements': [
+                    f"Producto {item['product']} en almacén {item['warehouse']}: "
+                    f"stock insuficiente. Disponible: {item['available']}, "
+                    f"Salida neta: {item['requested']}"
+                    for item in exc.shortages
+                ]
+            })
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = [
+            'id', 'cart', 'product', 'product_sku', 'warehouse', 'warehouse_name',
+            'quantity', 'status', 'expires_at', 'created_by', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class ReservationLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    warehouse = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class ReserveSerializer(serializers.Serializer):
+    """
+    Retenciones de un carrito. Cada línea fija la cantidad retenida de ese
+    producto en ese almacén (0 la libera) y renueva el vencimiento.
+    """
+    cart = serializers.CharField(max_length=64)
+    lines = ReservationLineSerializer(many=True, allow_empty=False)
+    ttl = serializers.IntegerField(min_value=30, max_value=86400, required=False)
+
+    MAX_LINES = 200
+
+    def validate_lines(self, value):
+        if len(value) > self.MAX_LINES:
+            raise serializers.ValidationError(
+                f"Máximo {self.MAX_LINES} líneas por carrito"
+            )
+        keys = [(line['product'], line['warehouse']) for line in value]
+        if len(keys) != len(set(keys)):
+            raise serializers.ValidationError(
+                "No puede incluir el mismo producto y almacén más de una vez"
+            )
+        return value
+
+    def create(self, validated_data):
+        """Aplica todas las líneas o ninguna"""
+        try:
+            return reserve(
+                validated_data['cart'],
+                {(line['product'], line['warehouse']): line['quantity']
+                 for line in validated_data['lines']},
+                user=validated_data.get('created_by'),
+                ttl=validated_data.get('ttl')
+            )
+        except InsufficientStockError as exc:
+            raise serializers.ValidationError({
+                'lines': [
+                    f"Producto {item['product']} en almacén {item['warehouse']}: "
+                    f"stock insuficiente. Disponible: {item['available']}, "
+                    f"Solicitado: {item['requested']}"
+                    for item in exc.shortages
+                ]
+            })
@@ -0,0 +1,398 @@
+import datetime
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Sum, Exists, OuterRef, Case, When, F, IntegerField, Max
+from django.utils import timezone
+
+from applications.catalog.lookup import invalidate_products
+from applications.catalog.models import Product
+from .alerts import notify_low_stock
+from .models import (
+    Stock, Movement, ProductStockSummary, StockTransfer, StockTransferLine, StockSnapshot
+)
+
+# Cantidad con signo de un movimiento: entradas suman, salidas restan
+NET_QUANTITY = Case(
+    When(type=Movement.IN, then=F('quantity')),
+    default=-F('quantity'),
+    output_field=IntegerField()
+)
+SNAPSHOT_BATCH_SIZE = 5000
+ADJUSTMENT_REFERENCE = 'AJUSTE'
+UPSERT_CHUNK_SIZE = 1000
+
+
+class InsufficientStockError(ValueError):
+    """Alguna línea pide más de lo disponible; no se aplica nada"""
+
+    def __init__(self, shortages):
+        # [{'product': id, 'warehouse': id, 'available': n, 'requested': n}, ...]
+        self.shortages = shortages
+        super().__init__('Stock insuficiente para: ' + ', '.join(
+            str(item['product']) for item in shortages[:20]
+        ))
+
+
+def update_stock_summaries(deltas, movement_at):
+    """
+    Aplica al resumen de stock los cambios netos por producto
+    ({product_id: (delta de cantidad, delta de almacenes con stock)}).
+
+    Crea en cero los resúmenes que falten, los bloquea ordenados por
+    producto y suma los deltas a lo que haya en la fila (total_quantity =
+    total_quantity + delta), nunca un total leído antes: dos escrituras
+    concurrentes del mismo producto en distintos almacenes no se pisan.
+    is_low se recalcula con el total nuevo en el mismo UPDATE.
+    Retorna los productos que acaban de cruzar a stock bajo.
+    """
+    deltas = dict(sorted(deltas.items()))
+    if not deltas:
+        return []
+
+    # Sin resumen previo no hay stock registrado: cuenta como bajo
+    ProductStockSummary.objects.bulk_create(
+        [ProductStockSummary(product_id=product_id) for product_id in deltas],
+        ignore_conflicts=True
+    )
+    was_low = dict(
+        ProductStockSummary.objects.select_for_update().filter(
+            product_id__in=deltas
+        ).order_by('product_id').values_list('product_id', 'is_low')
+    )
+
+    table = connection.ops.quote_name(ProductStockSummary._meta.db_table)
+    products = connection.ops.quote_name(Product._meta.db_table)
+    rows = list(deltas.items())
+    is_low = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+            cursor.execute(
+                f'UPDATE {table} SET '
+                f'total_quantity = {table}.total_quantity + delta.quantity, '
+                f'warehouses_count = {table}.warehouses_count + delta.warehouses, '
+                f'is_low = {table}.total_quantity + delta.quantity <= product.min_stock, '
+                f'last_movement_at = %s, updated_at = %s '
+                f'FROM (VALUES {", ".join(["(%s::integer, %s::integer, %s::integer)"] * len(chunk))}) '
+                f'AS delta (product_id, quantity, warehouses), {products} product '
+                f'WHERE {table}.product_id = delta.product_id '
+                f'AND product.id = delta.product_id '
+                f'RETURNING {table}.product_id, {table}.is_low',
+                [movement_at, movement_at] + [
+                    value for product_id, (quantity, warehouses) in chunk
+                    for value in (product_id, quantity, warehouses)
+                ]
+            )
+            is_low.update(cursor.fetchall())
+
+    invalidate_products(deltas)
+    return [
+        product_id for product_id, low in is_low.items()
+        if low and not was_low[product_id]
+    ]
+
+
+def low_stock_flag(quantity_field):
+    """Expresión `quantity_field <= product.min_stock` para un UPDATE"""
+    return Exists(Product.objects.filter(
+        pk=OuterRef('product_id'),
+        min_stock__gte=OuterRef(quantity_field)
+    ))
+
+
+def refresh_low_stock_flags(product_ids):
+    """Recalcula is_low de Stock y del resumen con un UPDATE por tabla"""
+    Stock.objects.filter(product_id__in=product_ids).update(
+        is_low=low_stock_flag('quantity')
+    )
+    ProductStockSummary.objects.filter(product_id__in=product_ids).update(
+        is_low=low_stock_flag('total_quantity')
+    )
+
+
+def post_inventory(entries, reference, user=None, notes=None, allow_negative=False,
+                   costs=None):
+    """
+    Único punto de escritura de Stock: aplica los deltas de un documento
+    (compra, venta, transferencia, ajuste) en una sola pasada.
+
+    `entries` es un iterable de (product_id, warehouse_id, delta); se
+    registra un movimiento por (producto, almacén) con el delta neto.
+    `costs` ({(product_id, warehouse_id): costo unitario}) valora las entradas.
+    Retorna los movimientos creados (ver post_movements).
+    """
+    deltas = defaultdict(int)
+    for product_id, warehouse_id, delta in entries:
+        deltas[(product_id, warehouse_id)] += delta
+    return post_movements([
+        Movement(
+            product_id=product_id, warehouse_id=warehouse_id,
+            type=Movement.IN if delta > 0 else Movement.OUT,
+            quantity=abs(delta), reference=reference,
+            notes=notes or None, created_by=user
+        )
+        for (product_id, warehouse_id), delta in sorted(deltas.items()) if delta
+    ], allow_negative=allow_negative, costs=costs)
+
+
+@transaction.atomic
+def post_movements(movements, allow_negative=False, costs=None):
+    """
+    Registra los movimientos tal cual (bulk insert) y aplica a Stock su
+    efecto neto por (producto, almacén).
+
+    Las filas existentes se bloquean con un único SELECT ... FOR UPDATE
+    ordenado por id y los deltas se aplican con
+    INSERT ... ON CONFLICT DO UPDATE SET quantity = quantity + delta, que
+    también crea las filas que falten; luego un UPDATE recalcula is_low.
+    Lanza InsufficientStockError sin escribir nada si algún almacén
+    quedaría en negativo.
+
+    Las entradas netas con costo en `costs` van en un upsert aparte que
+    además actualiza avg_cost: (existente * promedio + entrada * costo) /
+    (existente + entrada). Las demás (ajustes, ventas) no cambian el promedio.
+    """
+    if not movements:
+        return []
+
+    deltas = defaultdict(int)
+    for movement in movements:
+        sign = 1 if movement.type == Movement.IN else -1
+        deltas[(movement.product_id, movement.warehouse_id)] += sign * movement.quantity
+    deltas = {key: delta for key, delta in sorted(deltas.items()) if delta}
+    product_ids = {product_id for product_id, _ in deltas}
+    warehouse_ids = {warehouse_id for _, warehouse_id in deltas}
+
+    # product x almacén puede bloquear alguna fila de más, a cambio de un
+    # filtro simple en lugar de un OR por cada par
+    locked = {
+        (product_id, warehouse_id): quantity
+        for product_id, warehouse_id, quantity in Stock.objects.select_for_update().filter(
+            product_id__in=product_ids, warehouse_id__in=warehouse_ids
+        ).order_by('pk').values_list('product_id', 'warehouse_id', 'quantity')
+    }
+
+    if not allow_negative:
+        shortages = [
+            {'product': product_id, 'warehouse': warehouse_id,
+             'available': locked.get((product_id, warehouse_id), 0), 'requested': -delta}
+            for (product_id, warehouse_id), delta in deltas.items()
+            if locked.get((product_id, warehouse_id), 0) + delta < 0
+        ]
+        if shortages:
+            raise InsufficientStockError(shortages)
+
+    now = timezone.now()
+    costs = {
+        key: cost for key, cost in (costs or {}).items() if deltas.get(key, 0) > 0
+    }
+    _upsert_stock_deltas(
+        {key: delta for key, delta in deltas.items() if key not in costs}, now
+    )
+    _upsert_stock_deltas(
+        {key: delta for key, delta in deltas.items() if key in costs}, now, costs
+    )
+    Stock.objects.filter(
+        product_id__in=product_ids, warehouse_id__in=warehouse_ids
+    ).update(is_low=low_stock_flag('quantity'))
+    movements = Movement.objects.bulk_create(movements, batch_size=UPSERT_CHUNK_SIZE)
+
+    # Las filas de Stock siguen bloqueadas: el antes y el después son exactos
+    summary_deltas = defaultdict(lambda: (0, 0))
+    for (product_id, warehouse_id), delta in deltas.items():
+        before = locked.get((product_id, warehouse_id), 0)
+        quantity, warehouses = summary_deltas[product_id]
+        summary_deltas[product_id] = (
+            quantity + delta,
+            warehouses + (before + delta > 0) - (before > 0)
+        )
+    crossed = update_stock_summaries(summary_deltas, movement_at=now)
+    notify_low_stock(crossed)
+    return movements
+
+
+def _upsert_stock_deltas(deltas, now, costs=None):
+    """
+    quantity += delta por (producto, almacén), creando las filas que falten.
+    Con `costs`, avg_cost pasa a ser el promedio ponderado con la entrada
+    (el stock negativo cuenta como cero).
+    """
+    table = connection.ops.quote_name(Stock._meta.db_table)
+    rows = list(deltas.items())
+    set_avg_cost = ''
+    if costs:
+        on_hand = f'GREATEST({table}.quantity, 0)'
+        set_avg_cost = (
+            f'avg_cost = ({on_hand} * {table}.avg_cost + EXCLUDED.quantity * EXCLUDED.avg_cost) '
+            f'/ ({on_hand} + EXCLUDED.quantity), '
+        )
+    costs = costs or {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} (product_id, warehouse_id, quantity, is_low, avg_cost, '
+                f'created_at, updated_at) '
+                f'VALUES {", ".join(["(%s, %s, %s, TRUE, %s, %s, %s)"] * len(chunk))} '
+                f'ON CONFLICT (product_id, warehouse_id) DO UPDATE SET '
+                f'quantity = {table}.quantity + EXCLUDED.quantity, '
+                f'{set_avg_cost}'
+                f'updated_at = EXCLUDED.updated_at',
+                [value for (product_id, warehouse_id), delta in chunk
+                 for value in (product_id, warehouse_id, delta,
+                               costs.get((product_id, warehouse_id), 0), now, now)]
+            )
+
+
+@transaction.atomic
+def set_stock_level(product_id, warehouse_id, quantity, user=None, notes=None):
+    """Lleva un Stock a `quantity` registrando el ajuste como movimiento"""
+    Stock.objects.bulk_create(
+        [Stock(product_id=product_id, warehouse_id=warehouse_id, quantity=0)],
+        ignore_conflicts=True
+    )
+    stock = Stock.objects.select_for_update().get(
+        product_id=product_id, warehouse_id=warehouse_id
+    )
+    post_inventory(
+        [(product_id, warehouse_id, quantity - stock.quantity)],
+        reference=ADJUSTMENT_REFERENCE, user=user, notes=notes
+    )
+    stock.refresh_from_db()
+    return stock
+
+
+@transaction.atomic
+def remove_stock(stock, user=None):
+    """Ajusta a 0 y elimina el registro de stock"""
+    set_stock_level(stock.product_id, stock.warehouse_id, 0, user=user)
+    Stock.objects.filter(pk=stock.pk).delete()
+
+
+@transaction.atomic
+def transfer_stock(from_warehouse, to_warehouse, lines, user=None, reference='', notes=''):
+    """Transfiere varias líneas {product_id: cantidad} entre dos almacenes"""
+    product_ids = sorted(lines)
+    transfer = StockTransfer.objects.create(
+        from_warehouse=from_warehouse, to_warehouse=to_warehouse,
+        reference=reference, notes=notes, created_by=user
+    )
+    StockTransferLine.objects.bulk_create([
+        StockTransferLine(transfer=transfer, product_id=pid, quantity=lines[pid])
+        for pid in product_ids
+    ])
+
+    entries = []
+    for pid in product_ids:
+        entries.append((pid, from_warehouse.pk, -lines[pid]))
+        entries.append((pid, to_warehouse.pk, lines[pid]))
+    # El destino recibe las unidades al costo promedio del origen
+    costs = {
+        (pid, to_warehouse.pk): avg_cost
+        for pid, avg_cost in Stock.objects.filter(
+            warehouse=from_warehouse, product_id__in=product_ids
+        ).values_list('product_id', 'avg_cost')
+    }
+    post_inventory(
+        entries, reference=f"TRF-{transfer.pk}", user=user, notes=notes, costs=costs
+    )
+    return transfer
+
+
+def end_of_day(day):
+    """Primer instante del día siguiente en la zona horaria local"""
+    return timezone.make_aware(
+        datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min)
+    )
+
+
+def _net_movements(since=None, until=None, product_ids=None, warehouse_ids=None):
+    """{(producto, almacén): entradas - salidas} en [since, until) con un GROUP BY"""
+    movements = Movement.objects.all()
+    if since is not None:
+        movements = movements.filter(created_at__gte=since)
+    if until is not None:
+        movements = movements.filter(created_at__lt=until)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    if warehouse_ids is not None:
+        movements = movements.filter(warehouse_id__in=warehouse_ids)
+    return {
+        (product_id, warehouse_id): net
+        for product_id, warehouse_id, net in movements.order_by().values(
+            'product_id', 'warehouse_id'
+        ).annotate(net=Sum(NET_QUANTITY)).values_list('product_id', 'warehouse_id', 'net')
+    }
+
+
+@transaction.atomic
+def take_stock_snapshot(day):
+    """
+    Guarda el stock al cierre de `day`: el stock actual menos los
+    movimientos registrados después del cierre. Reemplaza la foto de ese
+    día si ya existía. Retorna la cantidad de filas guardadas.
+
+    Stock y movimientos se leen en dos consultas; el bloqueo SHARE sobre
+    Stock espera a las escrituras en curso y frena las nuevas hasta el
+    final, así ninguna confirma entre ambas lecturas y cuenta en una sola.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'LOCK TABLE {connection.ops.quote_name(Stock._meta.db_table)} IN SHARE MODE'
+        )
+    quantities = {
+        (product_id, warehouse_id): quantity
+        for product_id, warehouse_id, quantity in Stock.objects.values_list(
+            'product_id', 'warehouse_id', 'quantity'
+        ).iterator(chunk_size=SNAPSHOT_BATCH_SIZE)
+    }
+    for key, net in _net_movements(since=end_of_day(day)).items():
+        quantities[key] = quantities.get(key, 0) - net
+
+    StockSnapshot.objects.filter(date=day).delete()
+    snapshots = StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_id=product_id, warehouse_id=warehouse_id,
+                      date=day, quantity=quantity)
+        for (product_id, warehouse_id), quantity in quantities.items()
+        if quantity
+    ], batch_size=SNAPSHOT_BATCH_SIZE)
+    return len(snapshots)
+
+
+def stock_as_of(moment, product_ids=None, warehouse_ids=None):
+    """
+    Stock por (producto, almacén) en un instante pasado.
+
+    Parte de la foto diaria más reciente cerrada antes de `moment` y le suma
+    solo los movimientos posteriores a esa foto. Sin fotos previas, recorre
+    el historial completo de movimientos.
+    Retorna (fecha de la foto usada o None, {(producto, almacén): cantidad}).
+    """
+    snapshots = StockSnapshot.objects.all()
+    if product_ids is not None:
+        snapshots = snapshots.filter(product_id__in=product_ids)
+    if warehouse_ids is not None:
+        snapshots = snapshots.filter(warehouse_id__in=warehouse_ids)
+
+    base_date = StockSnapshot.objects.filter(
+        date__lt=timezone.localtime(moment).date()
+    ).aggregate(date=Max('date'))['date']
+
+    quantities = {}
+    since = None
+    if base_date is not None:
+        quantities = {
+            (product_id, warehouse_id): quantity
+            for product_id, warehouse_id, quantity in snapshots.filter(
+                date=base_date
+            ).values_list('product_id', 'warehouse_id', 'quantity')
+        }
+        since = end_of_day(base_date)
+
+    tail = _net_movements(since=since, until=moment,
+                          product_ids=product_ids, warehouse_ids=warehouse_ids)
+    for key, net in tail.items():
+        quantities[key] = quantities.get(key, 0) + net
+
+    return base_date, {key: quantity for key, quantity in quantities.items() if quantity}
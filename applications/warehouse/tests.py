@@ -1,3 +1,506 @@
-from django.test import TestCase
+import datetime
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from applications.catalog.models import Category, Product
+from applications.core.models import Notification
+from applications.purchases.models import Supplier
+from applications.users.models import User
+from .models import (
+    Movement, ProductStockSummary, Stock, StockReservation, StockSnapshot, Warehouse
+)
+from .partitions import default_partition_months, list_partitions, route_default_rows
+from .reservations import available_to_sell, expire_reservations, reserve
+from .serializers import MovementBatchSerializer
+from .services import (
+    InsufficientStockError, post_inventory, post_movements, remove_stock, stock_as_of,
+    take_stock_snapshot
+)
+
+
+class InventoryFixtures:
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Abarrotes')
+        cls.rice = Product.objects.create(
+            sku='ARROZ', name='Arroz', category=cls.category,
+            price=Decimal('5.00'), min_stock=10
+        )
+        cls.sugar = Product.objects.create(
+            sku='AZUCAR', name='Azúcar', category=cls.category,
+            price=Decimal('4.00'), min_stock=0
+        )
+        cls.main = Warehouse.objects.create(name='Central')
+        cls.branch = Warehouse.objects.create(name='Sucursal')
+
+    def quantity(self, product, warehouse):
+        return Stock.objects.get(product=product, warehouse=warehouse).quantity
+
+    def assertSummaryMatchesStock(self, product):
+        summary = ProductStockSummary.objects.get(product=product)
+        stock = Stock.objects.filter(product=product).aggregate(
+            total=Sum('quantity'), warehouses=Count('id', filter=Q(quantity__gt=0))
+        )
+        self.assertEqual(
+            (summary.total_quantity, summary.warehouses_count, summary.is_low),
+            (stock['total'] or 0, stock['warehouses'],
+             (stock['total'] or 0) <= product.min_stock)
+        )
+
+
+class PostInventoryTests(InventoryFixtures, TestCase):
+    def test_first_entry_creates_the_stock_row(self):
+        self.assertFalse(Stock.objects.exists())
+        post_inventory([(self.rice.pk, self.main.pk, 25)], reference='PUR-1')
+        self.assertEqual(self.quantity(self.rice, self.main), 25)
+
+    def test_entries_are_netted_per_product_and_warehouse(self):
+        movements = post_inventory([
+            (self.rice.pk, self.main.pk, 30),
+            (self.rice.pk, self.main.pk, -12),
+            (self.rice.pk, self.branch.pk, 7),
+            (self.sugar.pk, self.main.pk, 5),
+            (self.sugar.pk, self.main.pk, -5),
+        ], reference='DOC-1')
+
+        self.assertEqual(self.quantity(self.rice, self.main), 18)
+        self.assertEqual(self.quantity(self.rice, self.branch), 7)
+        # Un movimiento por clave con delta neto; los netos en cero no se registran
+        self.assertEqual(len(movements), 2)
+        self.assertEqual(
+            sorted(Movement.objects.values_list('warehouse_id', 'type', 'quantity')),
+            sorted([(self.main.pk, Movement.IN, 18), (self.branch.pk, Movement.IN, 7)])
+        )
+
+    def test_post_movements_keeps_every_movement_and_applies_the_net(self):
+        post_movements([
+            Movement(product=self.rice, warehouse=self.main, type=Movement.IN, quantity=10),
+            Movement(product=self.rice, warehouse=self.main, type=Movement.OUT, quantity=4),
+        ])
+        self.assertEqual(Movement.objects.count(), 2)
+        self.assertEqual(self.quantity(self.rice, self.main), 6)
+
+    def test_shortage_raises_without_partial_writes(self):
+        post_inventory([(self.rice.pk, self.main.pk, 5)], reference='PUR-1')
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            post_inventory([
+                (self.sugar.pk, self.main.pk, 50),
+                (self.rice.pk, self.main.pk, -8),
+            ], reference='SALE-1')
+
+        self.assertEqual(raised.exception.shortages, [{
+            'product': self.rice.pk, 'warehouse': self.main.pk,
+            'available': 5, 'requested': 8
+        }])
+        self.assertEqual(self.quantity(self.rice, self.main), 5)
+        self.assertFalse(Stock.objects.filter(product=self.sugar).exists())
+        self.assertEqual(Movement.objects.count(), 1)
+
+    def test_allow_negative(self):
+        post_inventory(
+            [(self.rice.pk, self.main.pk, -3)], reference='AJUSTE', allow_negative=True
+        )
+        self.assertEqual(self.quantity(self.rice, self.main), -3)
+
+    def test_refreshes_is_low_and_the_summary(self):
+        post_inventory([
+            (self.rice.pk, self.main.pk, 8),
+            (self.rice.pk, self.branch.pk, 6),
+        ], reference='PUR-1')
+
+        # min_stock = 10: cada almacén está bajo, el total (14) no
+        self.assertTrue(Stock.objects.get(product=self.rice, warehouse=self.main).is_low)
+        summary = ProductStockSummary.objects.get(product=self.rice)
+        self.assertEqual(
+            (summary.total_quantity, summary.warehouses_count, summary.is_low),
+            (14, 2, False)
+        )
+        self.assertIsNotNone(summary.last_movement_at)
+
+        post_inventory([(self.rice.pk, self.main.pk, 20)], reference='PUR-2')
+        self.assertFalse(Stock.objects.get(product=self.rice, warehouse=self.main).is_low)
+
+        post_inventory([(self.rice.pk, self.main.pk, -28)], reference='SALE-1')
+        summary.refresh_from_db()
+        self.assertEqual(
+            (summary.total_quantity, summary.warehouses_count, summary.is_low),
+            (6, 1, True)
+        )
+
+    def test_summary_follows_stock_across_warehouses(self):
+        post_inventory([(self.rice.pk, self.main.pk, 12)], reference='PUR-1')
+        post_inventory([(self.rice.pk, self.branch.pk, 5)], reference='PUR-2')
+        self.assertSummaryMatchesStock(self.rice)
+
+        post_inventory([
+            (self.rice.pk, self.main.pk, -12),
+            (self.rice.pk, self.branch.pk, 3),
+        ], reference='TRF-1')
+        self.assertSummaryMatchesStock(self.rice)
+
+        post_inventory(
+            [(self.rice.pk, self.main.pk, -2)], reference='AJUSTE', allow_negative=True
+        )
+        self.assertSummaryMatchesStock(self.rice)
+
+        remove_stock(Stock.objects.get(product=self.rice, warehouse=self.branch))
+        self.assertSummaryMatchesStock(self.rice)
+        self.assertEqual(ProductStockSummary.objects.get(product=self.rice).total_quantity, -2)
+
+    def test_min_stock_change_refreshes_the_flags(self):
+        post_inventory([(self.rice.pk, self.main.pk, 15)], reference='PUR-1')
+        self.assertFalse(Stock.objects.get(product=self.rice, warehouse=self.main).is_low)
+
+        self.rice.min_stock = 20
+        self.rice.save()
+        self.assertTrue(Stock.objects.get(product=self.rice, warehouse=self.main).is_low)
+        self.assertTrue(ProductStockSummary.objects.get(product=self.rice).is_low)
+
+    def test_weighted_average_cost(self):
+        key = (self.rice.pk, self.main.pk)
+        post_inventory([(*key, 10)], reference='PUR-1', costs={key: Decimal('2.00')})
+        post_inventory([(*key, 30)], reference='PUR-2', costs={key: Decimal('4.00')})
+        stock = Stock.objects.get(product=self.rice, warehouse=self.main)
+        # (10 * 2 + 30 * 4) / 40
+        self.assertEqual(stock.avg_cost, Decimal('3.5000'))
+
+        # Salidas y entradas sin costo no mueven el promedio
+        post_inventory([(*key, -25)], reference='SALE-1')
+        post_inventory([(*key, 5)], reference='AJUSTE')
+        stock.refresh_from_db()
+        self.assertEqual((stock.quantity, stock.avg_cost), (20, Decimal('3.5000')))
+
+        # 20 en mano a 3.5 + 20 a 5.0
+        post_inventory([(*key, 20)], reference='PUR-3', costs={key: Decimal('5.00')})
+        stock.refresh_from_db()
+        self.assertEqual(stock.avg_cost, Decimal('4.2500'))
+
+    def test_negative_stock_counts_as_zero_in_the_average(self):
+        key = (self.rice.pk, self.main.pk)
+        post_inventory([(*key, 10)], reference='PUR-1', costs={key: Decimal('2.00')})
+        post_inventory([(*key, -15)], reference='AJUSTE', allow_negative=True)
+        post_inventory([(*key, 10)], reference='PUR-2', costs={key: Decimal('6.00')})
+        stock = Stock.objects.get(product=self.rice, warehouse=self.main)
+        self.assertEqual((stock.quantity, stock.avg_cost), (5, Decimal('6.0000')))
+
+
+class ConcurrentPostingTests(InventoryFixtures, TransactionTestCase):
+    def setUp(self):
+        self.setUpTestData()
+
+    def test_concurrent_postings_to_two_warehouses_keep_the_summary(self):
+        post_inventory([(self.rice.pk, self.main.pk, 10)], reference='PUR-1')
+
+        def post_to_branch():
+            try:
+                post_inventory([(self.rice.pk, self.branch.pk, 7)], reference='PUR-3')
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            post_inventory([(self.rice.pk, self.main.pk, 5)], reference='PUR-2')
+            # Otra conexión escribe el mismo producto en otro almacén: las filas
+            # de Stock no chocan y espera el resumen hasta que esta confirme
+            other = threading.Thread(target=post_to_branch)
+            other.start()
+            other.join(timeout=0.5)
+            self.assertTrue(other.is_alive())
+        other.join()
+
+        self.assertEqual(self.quantity(self.rice, self.main), 15)
+        self.assertEqual(self.quantity(self.rice, self.branch), 7)
+        self.assertSummaryMatchesStock(self.rice)
+
+    def test_snapshot_waits_for_postings_in_flight(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        post_inventory([(self.rice.pk, self.main.pk, 10)], reference='PUR-1')
+        Movement.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+
+        def snapshot():
+            try:
+                take_stock_snapshot(yesterday)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            post_inventory([(self.rice.pk, self.main.pk, 5)], reference='PUR-2')
+            other = threading.Thread(target=snapshot)
+            other.start()
+            other.join(timeout=0.5)
+            self.assertTrue(other.is_alive())
+        other.join()
+
+        # Stock (15) menos lo posterior al cierre (5): la entrada cuenta en ambas lecturas
+        self.assertEqual(
+            list(StockSnapshot.objects.values_list('date', 'quantity')), [(yesterday, 10)]
+        )
+
+
+class StockSnapshotTests(InventoryFixtures, TestCase):
+    def test_snapshot_discounts_movements_after_the_close(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        post_inventory([(self.rice.pk, self.main.pk, 10)], reference='PUR-1')
+        Movement.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+        post_inventory([(self.rice.pk, self.main.pk, -4)], reference='SALE-1')
+
+        self.assertEqual(take_stock_snapshot(yesterday), 1)
+        self.assertEqual(
+            StockSnapshot.objects.get(product=self.rice, warehouse=self.main).quantity, 10
+        )
+        self.assertEqual(
+            stock_as_of(timezone.now())[1], {(self.rice.pk, self.main.pk): 6}
+        )
+
+
+class LowStockAlertTests(InventoryFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # bulk_create: sin la señal post_save que crea el Profile
+        User.objects.bulk_create([User(username='almacen', role=User.ALMACENERO)])
+
+    def test_crossing_min_stock_notifies_once_after_commit(self):
+        post_inventory([(self.rice.pk, self.main.pk, 15)], reference='PUR-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            post_inventory([(self.rice.pk, self.main.pk, -8)], reference='SALE-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            post_inventory([(self.rice.pk, self.main.pk, 4)], reference='PUR-2')
+            post_inventory([(self.rice.pk, self.main.pk, -4)], reference='SALE-2')
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_a_failing_alert_does_not_break_the_posting(self):
+        post_inventory([(self.rice.pk, self.main.pk, 15)], reference='PUR-1')
+        with mock.patch.object(
+            Notification.objects, 'bulk_create', side_effect=RuntimeError('caído')
+        ), self.assertLogs('django.test', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                post_inventory([(self.rice.pk, self.main.pk, -8)], reference='SALE-1')
+        self.assertEqual(self.quantity(self.rice, self.main), 7)
+
+
+class ReservationTests(InventoryFixtures, TestCase):
+    def setUp(self):
+        post_inventory([(self.rice.pk, self.main.pk, 10)], reference='PUR-1')
+        self.key = (self.rice.pk, self.main.pk)
+
+    def test_reserving_again_replaces_the_cart_hold(self):
+        first, = reserve('CART-A', {self.key: 6})
+        # Con 10 en stock, 8 solo alcanza si la retención previa se libera
+        second, = reserve('CART-A', {self.key: 8})
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, StockReservation.RELEASED)
+        self.assertEqual(
+            list(StockReservation.objects.filter(
+                status=StockReservation.ACTIVE
+            ).values_list('pk', 'quantity')),
+            [(second.pk, 8)]
+        )
+
+    def test_zero_quantity_releases_the_hold(self):
+        reserve('CART-A', {self.key: 6})
+        self.assertEqual(reserve('CART-A', {self.key: 0}), [])
+        self.assertFalse(StockReservation.objects.filter(
+            status=StockReservation.ACTIVE
+        ).exists())
+
+    def test_holds_only_reduce_availability_for_other_carts(self):
+        reserve('CART-A', {self.key: 6})
+
+        self.assertEqual(available_to_sell([self.rice.pk]), {self.key: 4})
+        self.assertEqual(available_to_sell([self.rice.pk], exclude_cart='CART-A'), {self.key: 10})
+        self.assertEqual(available_to_sell([self.rice.pk], exclude_cart='CART-B'), {self.key: 4})
+
+        with self.assertRaises(InsufficientStockError) as raised:
+            reserve('CART-B', {self.key: 5})
+        self.assertEqual(raised.exception.shortages[0]['available'], 4)
+        reserve('CART-B', {self.key: 4})
+        self.assertEqual(available_to_sell([self.rice.pk]), {self.key: 0})
+
+    def test_expired_holds_stop_counting_before_the_sweep(self):
+        reserve('CART-A', {self.key: 6}, ttl=60)
+        StockReservation.objects.update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(available_to_sell([self.rice.pk]), {self.key: 10})
+
+    def test_expiry_runs_in_batches(self):
+        now = timezone.now()
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                cart=f'CART-{index}', product=self.rice, warehouse=self.main,
+                quantity=1, expires_at=now - datetime.timedelta(minutes=index + 1)
+            )
+            for index in range(5)
+        ] + [
+            StockReservation(
+                cart='CART-LIVE', product=self.rice, warehouse=self.main,
+                quantity=1, expires_at=now + datetime.timedelta(minutes=5)
+            )
+        ])
+
+        # Lotes de 2, 2 y 1: un SELECT y un UPDATE por lote más el SELECT vacío final
+        with self.assertNumQueries(7):
+            self.assertEqual(expire_reservations(batch_size=2, now=now), 5)
+
+        self.assertEqual(
+            StockReservation.objects.get(cart='CART-LIVE').status, StockReservation.ACTIVE
+        )
+        self.assertEqual(
+            StockReservation.objects.filter(status=StockReservation.EXPIRED).count(), 5
+        )
+
+
+class PartitionTests(InventoryFixtures, TestCase):
+    def test_default_partition_rows_are_routed_before_archiving(self):
+        movement = Movement.objects.create(
+            product=self.rice, warehouse=self.main, type=Movement.IN, quantity=1
+        )
+        # Más allá de las particiones creadas: cae en la partición por defecto
+        Movement.objects.filter(pk=movement.pk).update(
+            created_at=datetime.datetime(2099, 5, 10, tzinfo=datetime.timezone.utc)
+        )
+        self.assertIn(datetime.date(2099, 5, 1), default_partition_months())
+
+        routed = route_default_rows(datetime.date(2099, 6, 1))
+
+        self.assertEqual(routed, [datetime.date(2099, 5, 1)])
+        self.assertIn(datetime.date(2099, 5, 1), list_partitions())
+        self.assertEqual(default_partition_months(), [])
+        self.assertTrue(Movement.objects.filter(pk=movement.pk).exists())
+
+    def test_months_after_the_cutoff_stay_in_the_default_partition(self):
+        movement = Movement.objects.create(
+            product=self.rice, warehouse=self.main, type=Movement.IN, quantity=1
+        )
+        Movement.objects.filter(pk=movement.pk).update(
+            created_at=datetime.datetime(2099, 5, 10, tzinfo=datetime.timezone.utc)
+        )
+        self.assertEqual(route_default_rows(datetime.date(2099, 5, 1)), [])
+        self.assertEqual(default_partition_months(), [datetime.date(2099, 5, 1)])
+
+
+class MovementBatchTests(InventoryFixtures, APITestCase):
+    url = '/api/warehouse/movements/batch/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # bulk_create: sin la señal post_save que crea el Profile
+        cls.user, = User.objects.bulk_create([
+            User(username='almacen', role=User.ALMACENERO)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def item(self, product, warehouse, type, quantity):
+        return {'product': product.pk, 'warehouse': warehouse.pk,
+                'type': type, 'quantity': quantity}
+
+    def test_applies_the_batch(self):
+        response = self.client.post(self.url, {'reference': 'REC-1', 'movements': [
+            self.item(self.rice, self.main, Movement.IN, 10),
+            self.item(self.rice, self.main, Movement.OUT, 3),
+            self.item(self.sugar, self.branch, Movement.IN, 4),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(self.quantity(self.rice, self.main), 7)
+        self.assertEqual(set(Movement.objects.values_list('reference', flat=True)), {'REC-1'})
+
+    def test_rejects_more_than_the_cap(self):
+        items = [self.item(self.rice, self.main, Movement.IN, 1)] * (
+            MovementBatchSerializer.MAX_MOVEMENTS + 1
+        )
+        response = self.client.post(self.url, {'movements': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('movements', response.data)
+        self.assertFalse(Movement.objects.exists())
+
+    def test_validates_products_and_warehouses_with_one_query_each(self):
+        self.main.is_active = False
+        self.main.save()
+        items = [self.item(self.rice, self.branch, Movement.IN, 1)] * 50 + [
+            {'product': 0, 'warehouse': self.branch.pk, 'type': Movement.IN, 'quantity': 1},
+            self.item(self.sugar, self.main, Movement.IN, 1),
+        ]
+        serializer = MovementBatchSerializer(data={'movements': items})
+        with self.assertNumQueries(2):
+            self.assertFalse(serializer.is_valid())
+        errors = serializer.errors['movements']
+        self.assertEqual(set(errors), {50, 51})
+        self.assertIn('product', errors[50])
+        self.assertIn('warehouse', errors[51])
+
+    def test_one_shortage_rejects_the_whole_batch(self):
+        post_inventory([(self.rice.pk, self.main.pk, 5)], reference='PUR-1')
+        response = self.client.post(self.url, {'movements': [
+            self.item(self.sugar, self.main, Movement.IN, 20),
+            self.item(self.rice, self.main, Movement.OUT, 2),
+            self.item(self.rice, self.main, Movement.OUT, 4),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['movements']), 1)
+        self.assertEqual(self.quantity(self.rice, self.main), 5)
+        self.assertFalse(Stock.objects.filter(product=self.sugar).exists())
+        self.assertEqual(Movement.objects.count(), 1)
+
+
+class StockValuationTests(InventoryFixtures, APITestCase):
+    url = '/api/warehouse/stocks/valuation/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # bulk_create: sin la señal post_save que crea el Profile
+        cls.user, = User.objects.bulk_create([User(username='admin', role=User.ADMIN)])
+        cls.supplier = Supplier.objects.create(name='Distribuidora')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def purchase(self, warehouse, details):
+        response = self.client.post('/api/purchases/purchases/', {
+            'supplier': self.supplier.pk, 'warehouse': warehouse.pk,
+            'purchase_date': datetime.date.today().isoformat(),
+            'total_amount': str(sum(quantity * Decimal(cost) for _, quantity, cost in details)),
+            'details': [
+                {'product': product.pk, 'quantity': quantity, 'cost_price': cost}
+                for product, quantity, cost in details
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_values_stock_at_average_cost(self):
+        self.purchase(self.main, [(self.rice, 10, '2.50'), (self.sugar, 4, '1.25')])
+        self.purchase(self.branch, [(self.rice, 2, '3.00')])
+
+        response = self.client.get(self.url, {'group_by': 'warehouse'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(group['name'], group['quantity'], group['value']) for group in response.data['groups']],
+            [('Central', 14, Decimal('30.00')), ('Sucursal', 2, Decimal('6.00'))]
+        )
+        self.assertEqual(
+            (response.data['total_quantity'], response.data['total_value']),
+            (16, Decimal('36.00'))
+        )
+
+        response = self.client.get(self.url, {'group_by': 'category', 'warehouse': self.branch.pk})
+        self.assertEqual(response.data['groups'], [{
+            'id': self.category.pk, 'name': 'Abarrotes',
+            'quantity': 2, 'value': Decimal('6.00')
+        }])
+
+    def test_rejects_an_unknown_grouping(self):
+        response = self.client.get(self.url, {'group_by': 'supplier'})
+        self.assertEqual(response.status_code, 400)
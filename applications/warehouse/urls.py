@@ -1,9 +1,14 @@
 from rest_framework.routers import DefaultRouter
-from .views import WarehouseViewSet, StockViewSet, MovementViewSet
+from .views import (
+    WarehouseViewSet, StockViewSet, MovementViewSet, StockTransferViewSet,
+    StockReservationViewSet
+)
 
 router = DefaultRouter()
 router.register(r'warehouses', WarehouseViewSet)
 router.register(r'stocks', StockViewSet)
 router.register(r'movements', MovementViewSet)
+router.register(r'transfers', StockTransferViewSet)
+router.register(r'stock-reservations', StockReservationViewSet)
 
 urlpatterns = router.urls
@@ -2,16 +2,31 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import F, Sum, Q
+from django.db.models import Sum, Q, F, DecimalField, ExpressionWrapper
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from applications.catalog.models import Product
 
-from .models import Warehouse, Stock, Movement
-from .serializers import WarehouseSerializer, StockSerializer, MovementSerializer
-from applications.users.permissions import IsAdminOrAlmacenero
+from .models import Warehouse, Stock, Movement, StockTransfer, StockReservation
+from .serializers import (
+    WarehouseSerializer, StockSerializer, MovementSerializer, StockTransferSerializer,
+    MovementBatchSerializer, StockReservationSerializer, ReserveSerializer
+)
+from .reconciliation import reconcile_stock, write_corrections
+from .reservations import available_to_sell, release
+from .services import (
+    transfer_stock, remove_stock, InsufficientStockError, stock_as_of, end_of_day
+)
+from applications.users.permissions import IsAdmin, IsAdminOrAlmacenero
+from applications.catalog.filters import ProductSearchFilter
+from applications.core.pagination import SelectablePagination
+from applications.core.mixins import SparseFieldsViewMixin
+from applications.core.exports import ExportMixin
 
 
 class WarehouseViewSet(viewsets.ModelViewSet):
     """ViewSet para gestión de almacenes"""
-    queryset = Warehouse.objects.all()
+    queryset = Warehouse.objects.with_stock_totals()
     serializer_class = WarehouseSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -33,13 +48,13 @@ class WarehouseViewSet(viewsets.ModelViewSet):
     def stock_list(self, request, pk=None):
         """Obtener todo el stock de un almacén"""
         warehouse = self.get_object()
-        stocks = warehouse.stocks.select_related('product').all()
+        stocks = warehouse.stocks.select_related('product', 'warehouse').all()
         
         serializer = StockSerializer(stocks, many=True)
         return Response({
             'warehouse': WarehouseSerializer(warehouse).data,
-            'total_products': stocks.count(),
-            'total_quantity': stocks.aggregate(total=Sum('quantity'))['total'] or 0,
+            'total_products': warehouse.get_products_count(),
+            'total_quantity': warehouse.get_total_stock(),
             'stocks': serializer.data
         })
 
@@ -47,9 +62,7 @@ class WarehouseViewSet(viewsets.ModelViewSet):
     def low_stock_items(self, request, pk=None):
         """Productos con stock bajo en este almacén"""
         warehouse = self.get_object()
-        low_stocks = warehouse.stocks.filter(
-            quantity__lte=F('product__min_stock')
-        ).select_related('product')
+        low_stocks = warehouse.stocks.filter(is_low=True).select_related('product', 'warehouse')
         
         serializer = StockSerializer(low_stocks, many=True)
         return Response(serializer.data)
@@ -61,6 +74,7 @@ class WarehouseViewSet(viewsets.ModelViewSet):
         
         report = []
         for warehouse in warehouses:
+            # get_queryset() ya trae los totales anotados: sin consultas por fila
             total_stock = warehouse.get_total_stock()
             capacity_used = warehouse.get_capacity_used()
             
@@ -76,34 +90,53 @@ class WarehouseViewSet(viewsets.ModelViewSet):
         return Response(report)
 
 
-class StockViewSet(viewsets.ModelViewSet):
+class StockViewSet(ExportMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de stock"""
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
+    select_related_fields = {
+        'product_name': 'product',
+        'product_sku': 'product',
+        'min_stock': 'product',
+        'warehouse_name': 'warehouse',
+    }
+    export_name = 'stock'
+    export_fields = {
+        'id': 'id',
+        'product_sku': 'product__sku',
+        'product_name': 'product__name',
+        'warehouse': 'warehouse__name',
+        'quantity': 'quantity',
+        'min_stock': 'product__min_stock',
+        'avg_cost': 'avg_cost',
+        'updated_at': 'updated_at',
+    }
+    valuation_groups = {
+        'warehouse': ('warehouse_id', 'warehouse__name'),
+        'category': ('product__category_id', 'product__category__name'),
+    }
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_fields = ['warehouse', 'product']
-    search_fields = ['product__name', 'product__sku', 'warehouse__name']
+    product_search_path = 'product__'
+    search_fields = ['warehouse__name']
     ordering_fields = ['quantity', 'updated_at']
     ordering = ['warehouse', 'product']
 
-    def get_queryset(self):
-        """Queryset optimizado"""
-        return Stock.objects.select_related(
-            'product', 'warehouse'
-        ).all()
+    def perform_destroy(self, instance):
+        """Ajusta a 0 (con movimiento) antes de eliminar el registro"""
+        remove_stock(instance, user=self.request.user)
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Productos con stock bajo en todos los almacenes"""
-        low_stocks = self.get_queryset().filter(
-            quantity__lte=F('product__min_stock')
-        )
+        low_stocks = self.get_queryset().filter(is_low=True)
         
-        serializer = self.get_serializer(low_stocks, many=True)
+        # El conteo sale de la misma lectura, sin un COUNT(*) aparte
+        stocks = self.get_serializer(low_stocks, many=True).data
         return Response({
-            'count': low_stocks.count(),
-            'stocks': serializer.data
+            'count': len(stocks),
+            'stocks': stocks
         })
 
     @action(detail=False, methods=['get'])
@@ -111,10 +144,10 @@ class StockViewSet(viewsets.ModelViewSet):
         """Productos sin stock"""
         out_of_stock = self.get_queryset().filter(quantity=0)
         
-        serializer = self.get_serializer(out_of_stock, many=True)
+        stocks = self.get_serializer(out_of_stock, many=True).data
         return Response({
-            'count': out_of_stock.count(),
-            'stocks': serializer.data
+            'count': len(stocks),
+            'stocks': stocks
         })
 
     @action(detail=False, methods=['get'])
@@ -137,9 +170,145 @@ class StockViewSet(viewsets.ModelViewSet):
             'stocks': serializer.data
         })
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
+    def valuation(self, request):
+        """
+        Valor del inventario (cantidad x costo promedio) agrupado por
+        ?group_by=warehouse|category, con un solo GROUP BY sobre Stock.
+        Filtro opcional ?warehouse=.
+        """
+        group_by = request.query_params.get('group_by', 'warehouse')
+        if group_by not in self.valuation_groups:
+            return Response(
+                {'error': 'group_by debe ser warehouse o category'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        key, name = self.valuation_groups[group_by]
+
+        stocks = Stock.objects.filter(quantity__gt=0)
+        if request.query_params.get('warehouse'):
+            try:
+                stocks = stocks.filter(warehouse_id=int(request.query_params['warehouse']))
+            except ValueError:
+                return Response(
+                    {'error': 'warehouse debe ser un ID numérico'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        # El alias no puede llamarse quantity: taparía el campo dentro de F('quantity')
+        rows = stocks.values(key, name).annotate(
+            total_quantity=Sum('quantity'),
+            value=Sum(ExpressionWrapper(
+                F('quantity') * F('avg_cost'),
+                output_field=DecimalField(max_digits=20, decimal_places=4)
+            ))
+        ).order_by(name)
+        groups = [
+            {'id': row[key], 'name': row[name],
+             'quantity': row['total_quantity'], 'value': round(row['value'], 2)}
+            for row in rows
+        ]
+        return Response({
+            'group_by': group_by,
+            'total_quantity': sum(group['quantity'] for group in groups),
+            'total_value': sum(group['value'] for group in groups),
+            'groups': groups
+        })
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[IsAdmin])
+    def reconcile(self, request):
+        """
+        Diferencias entre Stock y el historial de movimientos (?warehouse=,
+        ?opening_date=). POST con {"fix": true} registra las correcciones.
+        Para todo el inventario use el comando reconcile_stock (en paralelo).
+        """
+        params = request.data if request.method == 'POST' else request.query_params
+        try:
+            warehouse_ids = [int(params['warehouse'])] if params.get('warehouse') else None
+            opening_date = parse_date(params['opening_date']) if params.get('opening_date') else None
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'warehouse u opening_date inválidos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        drifts = reconcile_stock(warehouse_ids, opening_date=opening_date)
+        fixed = 0
+        if request.method == 'POST' and params.get('fix') in (True, 'true', '1') and drifts:
+            fixed = len(write_corrections(drifts, user=request.user))
+        return Response({
+            'count': len(drifts),
+            'total_drift': sum(abs(drift['drift']) for drift in drifts),
+            'fixed': fixed,
+            'drifts': drifts
+        })
+
+    @action(detail=False, methods=['get'])
+    def as_of(self, request):
+        """
+        Stock a una fecha pasada: ?date=YYYY-MM-DD (al cierre del día) o
+        ?datetime=<ISO 8601>; filtros opcionales product y warehouse.
+        """
+        date_param = request.query_params.get('date')
+        datetime_param = request.query_params.get('datetime')
+        try:
+            if date_param:
+                moment = end_of_day(parse_date(date_param))
+            elif datetime_param:
+                moment = parse_datetime(datetime_param)
+                if moment is None:
+                    raise ValueError()
+                if timezone.is_naive(moment):
+                    moment = timezone.make_aware(moment)
+            else:
+                raise ValueError()
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Se requiere date (YYYY-MM-DD) o datetime (ISO 8601) válido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        moment = min(moment, timezone.now())
+
+        try:
+            product_ids = [int(request.query_params['product'])] \
+                if request.query_params.get('product') else None
+            warehouse_ids = [int(request.query_params['warehouse'])] \
+                if request.query_params.get('warehouse') else None
+        except ValueError:
+            return Response(
+                {'error': 'product y warehouse deben ser IDs numéricos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        snapshot_date, quantities = stock_as_of(moment, product_ids, warehouse_ids)
+        products = Product.objects.only('sku', 'name').in_bulk(
+            {product_id for product_id, _ in quantities}
+        )
+        warehouses = Warehouse.objects.only('name').in_bulk(
+            {warehouse_id for _, warehouse_id in quantities}
+        )
+        stocks = [
+            {
+                'product': product_id,
+                'product_sku': products[product_id].sku,
+                'product_name': products[product_id].name,
+                'warehouse': warehouse_id,
+                'warehouse_name': warehouses[warehouse_id].name,
+                'quantity': quantity,
+            }
+            for (product_id, warehouse_id), quantity in sorted(quantities.items())
+        ]
+        return Response({
+            'as_of': moment,
+            'snapshot_date': snapshot_date,
+            'count': len(stocks),
+            'total_quantity': sum(quantities.values()),
+            'stocks': stocks
+        })
+
     @action(detail=False, methods=['post'])
     def transfer(self, request):
-        """Transferir stock entre almacenes"""
+        """Transferir un producto entre almacenes (ver StockTransferViewSet para varias líneas)"""
         product_id = request.data.get('product_id')
         from_warehouse_id = request.data.get('from_warehouse_id')
         to_warehouse_id = request.data.get('to_warehouse_id')
@@ -152,6 +321,16 @@ class StockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            product_id = int(product_id)
+            from_warehouse_id = int(from_warehouse_id)
+            to_warehouse_id = int(to_warehouse_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Identificadores inválidos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         if from_warehouse_id == to_warehouse_id:
             return Response(
                 {'error': 'Los almacenes de origen y destino deben ser diferentes'},
@@ -168,83 +347,87 @@ class StockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Verificar stock disponible
-        try:
-            from_stock = Stock.objects.get(
-                product_id=product_id,
-                warehouse_id=from_warehouse_id
-            )
-        except Stock.DoesNotExist:
+        warehouses = Warehouse.objects.in_bulk([from_warehouse_id, to_warehouse_id])
+        if len(warehouses) != 2:
             return Response(
-                {'error': 'No hay stock en el almacén de origen'},
+                {'error': 'Almacén no encontrado'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if from_stock.quantity < quantity:
+        try:
+            transfer_stock(
+                warehouses[from_warehouse_id],
+                warehouses[to_warehouse_id],
+                {product_id: quantity},
+                user=request.user
+            )
+        except InsufficientStockError as exc:
             return Response(
-                {'error': f'Stock insuficiente. Disponible: {from_stock.quantity}'},
+                {'error': f"Stock insuficiente. Disponible: {exc.shortages[0]['available']}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Crear movimientos de salida y entrada
-        Movement.objects.create(
-            product_id=product_id,
-            warehouse_id=from_warehouse_id,
-            type=Movement.OUT,
-            quantity=quantity,
-            reference=f'Transferencia a almacén {to_warehouse_id}',
-            created_by=request.user
-        )
-
-        Movement.objects.create(
-            product_id=product_id,
-            warehouse_id=to_warehouse_id,
-            type=Movement.IN,
-            quantity=quantity,
-            reference=f'Transferencia desde almacén {from_warehouse_id}',
-            created_by=request.user
-        )
-
-        # Actualizar stocks
-        from_stock.quantity -= quantity
-        from_stock.save()
-
-        to_stock, _ = Stock.objects.get_or_create(
-            product_id=product_id,
-            warehouse_id=to_warehouse_id,
-            defaults={'quantity': 0}
-        )
-        to_stock.quantity += quantity
-        to_stock.save()
-
+        stocks = {
+            stock.warehouse_id: stock
+            for stock in Stock.objects.filter(
+                product_id=product_id,
+                warehouse_id__in=[from_warehouse_id, to_warehouse_id]
+            ).select_related('product', 'warehouse')
+        }
         return Response({
             'message': 'Transferencia exitosa',
-            'from_stock': StockSerializer(from_stock).data,
-            'to_stock': StockSerializer(to_stock).data
+            'from_stock': StockSerializer(stocks[from_warehouse_id]).data,
+            'to_stock': StockSerializer(stocks[to_warehouse_id]).data
         })
 
 
-class MovementViewSet(viewsets.ModelViewSet):
+class MovementViewSet(ExportMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """ViewSet para gestión de movimientos"""
-    queryset = Movement.objects.all() 
+    queryset = Movement.objects.all()
     serializer_class = MovementSerializer
+    select_related_fields = {
+        'product_name': 'product',
+        'product_sku': 'product',
+        'warehouse_name': 'warehouse',
+        'created_by_username': 'created_by',
+    }
+    export_name = 'movimientos'
+    export_fields = {
+        'id': 'id',
+        'created_at': 'created_at',
+        'type': 'type',
+        'product_sku': 'product__sku',
+        'product_name': 'product__name',
+        'warehouse': 'warehouse__name',
+        'quantity': 'quantity',
+        'reference': 'reference',
+        'created_by': 'created_by__username',
+    }
     permission_classes = [IsAdminOrAlmacenero]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_fields = ['product', 'warehouse', 'type', 'created_by']
-    search_fields = ['product__name', 'product__sku', 'reference']
+    product_search_path = 'product__'
+    search_fields = ['reference']
     ordering_fields = ['created_at', 'quantity']
     ordering = ['-created_at']
-
-    def get_queryset(self):
-        """Queryset optimizado"""
-        return Movement.objects.select_related(
-            'product', 'warehouse', 'created_by'
-        ).all()
+    pagination_class = SelectablePagination
+    cursor_ordering = ('-created_at', '-id')
 
     def perform_create(self, serializer):
         """Asignar usuario actual al crear movimiento"""
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['post'], serializer_class=MovementBatchSerializer)
+    def batch(self, request):
+        """Registra un lote de movimientos IN/OUT en una sola transacción"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        movements = serializer.save(created_by=request.user)
+        return Response(
+            {'created': len(movements), 'ids': [movement.pk for movement in movements]},
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Movimientos recientes (últimos 50)"""
@@ -271,4 +454,98 @@ class MovementViewSet(viewsets.ModelViewSet):
             'count': movements.count(),
             'total_quantity': movements.aggregate(total=Sum('quantity'))['total'] or 0,
             'movements': serializer.data
-        })
\ No newline at end of file
+        })
+
+class StockTransferViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
+    """Documentos de transferencia: se crean y consultan, no se editan"""
+    queryset = StockTransfer.objects.all()
+    serializer_class = StockTransferSerializer
+    select_related_fields = {
+        'from_warehouse_name': 'from_warehouse',
+        'to_warehouse_name': 'to_warehouse',
+        'created_by_username': 'created_by',
+    }
+    prefetch_related_fields = {'lines': 'lines__product'}
+    permission_classes = [IsAdminOrAlmacenero]
+    http_method_names = ['get', 'post', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['from_warehouse', 'to_warehouse', 'created_by']
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+    pagination_class = SelectablePagination
+    cursor_ordering = ('-created_at', '-id')
+
+    def perform_create(self, serializer):
+        """Asignar usuario actual al crear la transferencia"""
+        serializer.save(created_by=self.request.user)
+
+
+class StockReservationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Retenciones de stock de carritos en curso (ver reservations.py)"""
+    queryset = StockReservation.objects.select_related('product', 'warehouse')
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['cart', 'status', 'product', 'warehouse']
+    ordering_fields = ['created_at', 'expires_at']
+    ordering = ['-created_at']
+
+    @action(detail=False, methods=['post'], serializer_class=ReserveSerializer)
+    def reserve(self, request):
+        """Retiene (o ajusta) las líneas de un carrito en una sola transacción"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservations = serializer.save(created_by=request.user)
+        return Response(
+            StockReservationSerializer(reservations, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['post'])
+    def release(self, request):
+        """Libera las retenciones de un carrito: {"cart": ..., "products": [ids]}"""
+        cart = request.data.get('cart')
+        products = request.data.get('products')
+        if not cart:
+            return Response(
+                {'error': 'Se requiere cart'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            product_ids = [int(pk) for pk in products] if products is not None else None
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'products debe ser una lista de IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'released': release(cart, product_ids)})
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Disponible para vender por almacén: ?products=1,2,3 y ?cart= opcional
+        (las retenciones de ese carrito cuentan como disponibles para él).
+        """
+        try:
+            product_ids = [
+                int(pk) for pk in request.query_params.get('products', '').split(',') if pk
+            ]
+        except ValueError:
+            return Response(
+                {'error': 'products debe ser una lista de IDs separados por coma'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not product_ids:
+            return Response(
+                {'error': 'Se requiere products'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        available = available_to_sell(
+            product_ids, exclude_cart=request.query_params.get('cart') or None
+        )
+        return Response([
+            {'product': product_id, 'warehouse': warehouse_id,
+             'available': max(quantity, 0)}
+            for (product_id, warehouse_id), quantity in sorted(available.items())
+        ])
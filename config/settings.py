@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party
     'rest_framework',
@@ -100,6 +101,34 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Las subidas van siempre a disco (nunca en memoria) y se hashean al vuelo
+FILE_UPLOAD_HANDLERS = ['applications.core.storage.HashingFileUploadHandler']
+
+# PRODUCT IMAGES (derivadas WebP generadas en segundo plano)
+PRODUCT_IMAGE_VARIANTS = {
+    'thumb': (200, 200),
+    'medium': (600, 600),
+    'large': (1200, 1200),
+}
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_IMAGE_WORKERS = int(os.getenv('PRODUCT_IMAGE_WORKERS', '2'))
+
+# CATALOG SYNC (feed de cambios para terminales POS)
+CATALOG_SYNC_LAG_SECONDS = 30
+CATALOG_SYNC_PAGE_SIZE = 500
+
+# PRODUCT LOOKUP (caché en memoria para lectores de códigos de barras)
+PRODUCT_LOOKUP_CACHE_SIZE = 10000
+PRODUCT_LOOKUP_CACHE_TTL = 15
+
+# MOVEMENTS (tabla particionada por mes, ver applications/warehouse/partitions.py)
+MOVEMENT_PARTITION_MONTHS_AHEAD = 3
+MOVEMENT_ARCHIVE_DIR = BASE_DIR / 'archive' / 'movements'
+
+# STOCK RESERVATIONS (retenciones de carritos, ver applications/warehouse/reservations.py)
+STOCK_RESERVATION_TTL = 900  # segundos
+STOCK_RESERVATION_SWEEP_BATCH = 1000
+
 # DEFAULT PRIMARY KEY
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 